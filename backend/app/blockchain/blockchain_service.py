@@ -4,7 +4,15 @@ Main orchestration service for all blockchain operations.
 Provides simple API for route handlers to store and verify records.
 """
 
+import atexit
 import os
+import queue
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from functools import cache
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime
 
@@ -12,33 +20,172 @@ from .hash_builder import HashBuilder
 from .fabric_client import get_fabric_client
 from .ipfs_client import get_ipfs_client
 from .encryption import get_encryption_service
-from .integrity_service import get_integrity_service
+from .integrity_service import get_integrity_service, invalidate_verification
 
 
-def _persist_to_db(record_type: str, record_id: int, blockchain_record_id: str, 
-                   tx_id: str, record_hash: str, ipfs_hash: str = None, 
+# (ms_epoch, formatted) pair; replaced atomically so no lock is needed
+_now_cache = (0, '')
+
+
+def _now_iso() -> str:
+    """
+    UTC timestamp with trailing Z, cached at millisecond granularity so
+    bulk store paths don't re-run datetime construction and ISO
+    formatting for every record.
+    """
+    global _now_cache
+    now_ms = time.time_ns() // 1_000_000
+    cached_ms, stamp = _now_cache
+    if now_ms != cached_ms:
+        stamp = datetime.utcnow().isoformat() + 'Z'
+        _now_cache = (now_ms, stamp)
+    return stamp
+
+
+_PERSIST_SQL = '''
+    INSERT INTO record_blockchain_map
+    (record_type, record_id, blockchain_record_id, transaction_id, record_hash,
+     file_hash, ipfs_hash, encryption_iv, created_by)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(record_type, record_id) DO UPDATE SET
+    transaction_id=excluded.transaction_id,
+    record_hash=excluded.record_hash,
+    file_hash=excluded.file_hash,
+    ipfs_hash=excluded.ipfs_hash,
+    encryption_iv=excluded.encryption_iv,
+    updated_at=CURRENT_TIMESTAMP
+'''
+
+# Write-behind queue: store_* calls enqueue rows and return immediately;
+# a background thread batches them into a single executemany + commit so
+# one fsync covers many records under burst load (e.g. bulk imports).
+_FLUSH_INTERVAL = 0.05   # seconds to wait for more rows before committing
+_FLUSH_BATCH = 64        # max rows per commit
+
+_persist_queue = queue.Queue()
+_persist_thread = None
+_persist_thread_lock = threading.Lock()
+
+
+def _persist_worker():
+    """Drain the persist queue in batches, one commit per batch."""
+    from ..database import get_db
+    while True:
+        rows = [_persist_queue.get()]
+        deadline = time.monotonic() + _FLUSH_INTERVAL
+        while len(rows) < _FLUSH_BATCH:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                rows.append(_persist_queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        try:
+            # Thread-local connection; stays open for the worker's lifetime
+            db = get_db()
+            db.executemany(_PERSIST_SQL, rows)
+            db.commit()
+        except Exception as e:
+            print(f"Warning: Failed to persist blockchain records to DB: {e}")
+        finally:
+            for _ in rows:
+                _persist_queue.task_done()
+
+
+def _ensure_persist_worker():
+    """Start the background persist thread on first use."""
+    global _persist_thread
+    if _persist_thread is None or not _persist_thread.is_alive():
+        with _persist_thread_lock:
+            if _persist_thread is None or not _persist_thread.is_alive():
+                _persist_thread = threading.Thread(
+                    target=_persist_worker, name='blockchain-persist', daemon=True
+                )
+                _persist_thread.start()
+
+
+# Content-addressed memory of recently persisted rows. Idempotent retries
+# (same record, same hashes) are dropped before they reach the queue, so a
+# retry storm costs a set lookup instead of an SQLite journal write.
+_RECENT_PERSISTS_MAX = 65536
+_recent_persists = OrderedDict()
+_recent_persists_lock = threading.Lock()
+
+
+def _is_duplicate_persist(key) -> bool:
+    """Check-and-record a persist key; True if it was seen recently."""
+    with _recent_persists_lock:
+        if key in _recent_persists:
+            _recent_persists.move_to_end(key)
+            return True
+        _recent_persists[key] = None
+        while len(_recent_persists) > _RECENT_PERSISTS_MAX:
+            _recent_persists.popitem(last=False)
+        return False
+
+
+def _persist_to_db(record_type: str, record_id: int, blockchain_record_id: str,
+                   tx_id: str, record_hash: str, ipfs_hash: str = None,
                    encryption_iv: str = None, file_hash: str = None, created_by: int = None):
-    """Persist blockchain record to database."""
-    try:
-        from ..database import get_db
-        db = get_db()
-        db.execute('''
-            INSERT INTO record_blockchain_map 
-            (record_type, record_id, blockchain_record_id, transaction_id, record_hash, 
-             file_hash, ipfs_hash, encryption_iv, created_by)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(record_type, record_id) DO UPDATE SET
-            transaction_id=excluded.transaction_id,
-            record_hash=excluded.record_hash,
-            file_hash=excluded.file_hash,
-            ipfs_hash=excluded.ipfs_hash,
-            encryption_iv=excluded.encryption_iv,
-            updated_at=CURRENT_TIMESTAMP
-        ''', [record_type, record_id, blockchain_record_id, tx_id, record_hash,
-              file_hash, ipfs_hash, encryption_iv, created_by])
-        db.commit()
-    except Exception as e:
-        print(f"Warning: Failed to persist blockchain record to DB: {e}")
+    """Queue blockchain record for write-behind persistence."""
+    if _is_duplicate_persist((record_type, record_id, record_hash, file_hash, ipfs_hash)):
+        return
+    # The chain now holds a new hash for this record; stale verification
+    # memos must not outlive the write
+    invalidate_verification(blockchain_record_id)
+    _ensure_persist_worker()
+    _persist_queue.put([record_type, record_id, blockchain_record_id, tx_id, record_hash,
+                        file_hash, ipfs_hash, encryption_iv, created_by])
+
+
+def flush_persist_queue():
+    """Block until all queued blockchain rows are committed."""
+    if _persist_thread is not None and _persist_thread.is_alive():
+        _persist_queue.join()
+
+
+atexit.register(flush_persist_queue)
+
+
+# Shared pool for network-bound blockchain work (IPFS uploads), so it can
+# overlap with CPU-bound hashing on the request thread.
+_io_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='blockchain-io')
+
+# Ciphertext spool threshold: encrypted report files up to this size stay
+# in memory; larger ones spill to disk before the streaming upload.
+_SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+
+
+class _LRUHashCache:
+    """
+    Thread-safe LRU cache of record hashes keyed by
+    (record_type, record_id, updated_at). The updated_at timestamp is a
+    cheap change fingerprint, so unchanged records skip the canonical
+    serialize + SHA-256 pass on re-store and re-verify.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self._entries = OrderedDict()
+        self._maxsize = maxsize
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[str]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def put(self, key, value: str):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+
+_hash_cache = _LRUHashCache()
 
 
 class BlockchainService:
@@ -55,6 +202,15 @@ class BlockchainService:
     TYPE_INVOICE = 'INVOICE'
     TYPE_APPOINTMENT = 'APPOINTMENT'
 
+    # Hash builder dispatch for store_batch: type -> (builder name, extra data key)
+    _BATCH_BUILDERS = {
+        TYPE_PATIENT: ('build_patient_hash', None),
+        TYPE_VISIT: ('build_visit_hash', None),
+        TYPE_PRESCRIPTION: ('build_prescription_hash', 'medications'),
+        TYPE_INVOICE: ('build_invoice_hash', 'items'),
+        TYPE_APPOINTMENT: ('build_appointment_hash', None),
+    }
+
     def __init__(self):
         self.hash_builder = HashBuilder()
         self.fabric_client = get_fabric_client()
@@ -62,39 +218,71 @@ class BlockchainService:
         self.encryption_service = get_encryption_service()
         self.integrity_service = get_integrity_service()
 
+    def _build_record_hash(self, record_type: str, db_id: int, data: Dict[str, Any],
+                           builder, *extra) -> str:
+        """
+        Build a record hash, memoized by (type, id, updated_at) when the
+        record carries an updated_at fingerprint. Records without one are
+        hashed unconditionally.
+        """
+        fingerprint = data.get('updated_at') if isinstance(data, dict) else None
+        if not fingerprint:
+            return builder(data, *extra)
+        key = (record_type, db_id, fingerprint)
+        record_hash = _hash_cache.get(key)
+        if record_hash is None:
+            record_hash = builder(data, *extra)
+            _hash_cache.put(key, record_hash)
+        return record_hash
+
     # =====================================================
-    # PATIENT OPERATIONS
+    # GENERIC STORE PATH
     # =====================================================
 
-    def store_patient(
+    def _store_record(
         self,
+        record_type: str,
+        record_pk: int,
         patient_id: int,
-        patient_data: Dict[str, Any],
+        record_data: Dict[str, Any],
+        builder,
+        extra_args: Tuple = (),
         metadata: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """
-        Store patient record hash on blockchain.
-        
+        Store a simple (form-only) record hash on blockchain.
+
+        Shared by the patient/visit/prescription/invoice/appointment
+        store methods, which differ only in type constant and hash
+        builder.
+
         Args:
-            patient_id: Patient database ID
-            patient_data: Patient record data
+            record_type: Record type constant (TYPE_PATIENT, ...)
+            record_pk: Record database ID
+            patient_id: Associated patient ID for indexing
+            record_data: Record data to hash
+            builder: build_*_hash function for this record type
+            extra_args: Extra positional args for the builder
+                (e.g. medications, invoice items)
             metadata: Optional metadata (created_by, etc.)
-            
+
         Returns:
             Result dict with success status and transaction details
         """
-        record_id = f'patient_{patient_id}'
-        patient_id_str = str(patient_id)
-        
+        record_id = f'{record_type.lower()}_{record_pk}'
+
         # Generate hash
-        record_hash = self.hash_builder.build_patient_hash(patient_data)
-        hash_payload = self.hash_builder.build_simple_hash_payload(record_hash)
-        
+        record_hash = self._build_record_hash(
+            record_type, record_pk, record_data, builder, *extra_args)
+        # Inlined HashBuilder.build_simple_hash_payload: a literal dict
+        # skips the method dispatch on every store
+        hash_payload = {'hash': record_hash}
+
         # Store on blockchain
         success, tx_id, error = self.fabric_client.add_record_hash(
             record_id=record_id,
-            record_type=self.TYPE_PATIENT,
-            patient_id=patient_id_str,
+            record_type=record_type,
+            patient_id=str(patient_id),
             hash_payload=hash_payload,
             metadata=metadata
         )
@@ -102,18 +290,92 @@ class BlockchainService:
         # Persist to database
         if success:
             created_by = metadata.get('createdBy') if metadata else None
-            _persist_to_db(self.TYPE_PATIENT, patient_id, record_id, tx_id, record_hash, created_by=created_by)
+            _persist_to_db(record_type, record_pk, record_id, tx_id, record_hash, created_by=created_by)
 
         return {
             'success': success,
             'recordId': record_id,
-            'recordType': self.TYPE_PATIENT,
+            'recordType': record_type,
             'hash': record_hash,
             'transactionId': tx_id if success else None,
             'error': error if not success else None,
-            'timestamp': datetime.utcnow().isoformat() + 'Z'
+            'timestamp': _now_iso()
+        }
+
+    def store_batch(
+        self,
+        records: List[Dict[str, Any]],
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """
+        Store multiple record hashes in a single Fabric transaction.
+
+        Bulk flows (seed data, re-anchoring imports) calling store_* in a
+        loop pay one orderer round trip per record; this computes all
+        hashes up front, submits one batched chaincode invocation, and
+        queues all DB rows so the persist worker commits them together.
+
+        Args:
+            records: List of dicts with 'record_type', 'record_id',
+                'patient_id' and 'data'; prescription entries also carry
+                'medications' and invoice entries 'items'
+            metadata: Optional metadata applied to every entry
+
+        Returns:
+            Result dict with success status, the shared transaction ID
+            and per-record hashes
+        """
+        entries = []
+        results = []
+        for record in records:
+            record_type = record['record_type']
+            record_pk = record['record_id']
+            builder, extra_key = self._BATCH_BUILDERS[record_type]
+            extra_args = (record[extra_key],) if extra_key else ()
+            record_hash = self._build_record_hash(
+                record_type, record_pk, record['data'],
+                getattr(self.hash_builder, builder), *extra_args)
+            record_id = f'{record_type.lower()}_{record_pk}'
+            entries.append((record_id, record_type, str(record['patient_id']),
+                            {'hash': record_hash}, metadata))
+            results.append({
+                'recordId': record_id,
+                'recordType': record_type,
+                'hash': record_hash
+            })
+
+        success, tx_id, error = self.fabric_client.add_record_hashes_batch(entries)
+
+        if success:
+            created_by = metadata.get('createdBy') if metadata else None
+            for record, result in zip(records, results):
+                _persist_to_db(record['record_type'], record['record_id'],
+                               result['recordId'], tx_id, result['hash'],
+                               created_by=created_by)
+
+        return {
+            'success': success,
+            'records': results,
+            'count': len(results),
+            'transactionId': tx_id if success else None,
+            'error': error if not success else None,
+            'timestamp': _now_iso()
         }
 
+    # =====================================================
+    # PATIENT OPERATIONS
+    # =====================================================
+
+    def store_patient(
+        self,
+        patient_id: int,
+        patient_data: Dict[str, Any],
+        metadata: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Store patient record hash on blockchain."""
+        return self._store_record(self.TYPE_PATIENT, patient_id, patient_id, patient_data,
+                                  self.hash_builder.build_patient_hash, metadata=metadata)
+
     def verify_patient(self, patient_id: int, patient_data: Dict[str, Any]) -> Dict[str, Any]:
         """Verify patient record integrity."""
         return self.integrity_service.verify_patient(patient_id, patient_data)
@@ -130,32 +392,8 @@ class BlockchainService:
         metadata: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """Store visit record hash on blockchain."""
-        record_id = f'visit_{visit_id}'
-        
-        record_hash = self.hash_builder.build_visit_hash(visit_data)
-        hash_payload = self.hash_builder.build_simple_hash_payload(record_hash)
-        
-        success, tx_id, error = self.fabric_client.add_record_hash(
-            record_id=record_id,
-            record_type=self.TYPE_VISIT,
-            patient_id=str(patient_id),
-            hash_payload=hash_payload,
-            metadata=metadata
-        )
-
-        if success:
-            created_by = metadata.get('createdBy') if metadata else None
-            _persist_to_db(self.TYPE_VISIT, visit_id, record_id, tx_id, record_hash, created_by=created_by)
-
-        return {
-            'success': success,
-            'recordId': record_id,
-            'recordType': self.TYPE_VISIT,
-            'hash': record_hash,
-            'transactionId': tx_id if success else None,
-            'error': error if not success else None,
-            'timestamp': datetime.utcnow().isoformat() + 'Z'
-        }
+        return self._store_record(self.TYPE_VISIT, visit_id, patient_id, visit_data,
+                                  self.hash_builder.build_visit_hash, metadata=metadata)
 
     def verify_visit(self, visit_id: int, visit_data: Dict[str, Any]) -> Dict[str, Any]:
         """Verify visit record integrity."""
@@ -174,32 +412,9 @@ class BlockchainService:
         metadata: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """Store prescription record hash on blockchain."""
-        record_id = f'prescription_{prescription_id}'
-        
-        record_hash = self.hash_builder.build_prescription_hash(prescription_data, medications)
-        hash_payload = self.hash_builder.build_simple_hash_payload(record_hash)
-        
-        success, tx_id, error = self.fabric_client.add_record_hash(
-            record_id=record_id,
-            record_type=self.TYPE_PRESCRIPTION,
-            patient_id=str(patient_id),
-            hash_payload=hash_payload,
-            metadata=metadata
-        )
-
-        if success:
-            created_by = metadata.get('createdBy') if metadata else None
-            _persist_to_db(self.TYPE_PRESCRIPTION, prescription_id, record_id, tx_id, record_hash, created_by=created_by)
-
-        return {
-            'success': success,
-            'recordId': record_id,
-            'recordType': self.TYPE_PRESCRIPTION,
-            'hash': record_hash,
-            'transactionId': tx_id if success else None,
-            'error': error if not success else None,
-            'timestamp': datetime.utcnow().isoformat() + 'Z'
-        }
+        return self._store_record(self.TYPE_PRESCRIPTION, prescription_id, patient_id,
+                                  prescription_data, self.hash_builder.build_prescription_hash,
+                                  extra_args=(medications,), metadata=metadata)
 
     def verify_prescription(
         self,
@@ -223,32 +438,9 @@ class BlockchainService:
         metadata: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """Store invoice record hash on blockchain."""
-        record_id = f'invoice_{invoice_id}'
-        
-        record_hash = self.hash_builder.build_invoice_hash(invoice_data, items)
-        hash_payload = self.hash_builder.build_simple_hash_payload(record_hash)
-        
-        success, tx_id, error = self.fabric_client.add_record_hash(
-            record_id=record_id,
-            record_type=self.TYPE_INVOICE,
-            patient_id=str(patient_id),
-            hash_payload=hash_payload,
-            metadata=metadata
-        )
-
-        if success:
-            created_by = metadata.get('createdBy') if metadata else None
-            _persist_to_db(self.TYPE_INVOICE, invoice_id, record_id, tx_id, record_hash, created_by=created_by)
-
-        return {
-            'success': success,
-            'recordId': record_id,
-            'recordType': self.TYPE_INVOICE,
-            'hash': record_hash,
-            'transactionId': tx_id if success else None,
-            'error': error if not success else None,
-            'timestamp': datetime.utcnow().isoformat() + 'Z'
-        }
+        return self._store_record(self.TYPE_INVOICE, invoice_id, patient_id, invoice_data,
+                                  self.hash_builder.build_invoice_hash,
+                                  extra_args=(items,), metadata=metadata)
 
     def verify_invoice(
         self,
@@ -271,32 +463,9 @@ class BlockchainService:
         metadata: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """Store appointment record hash on blockchain."""
-        record_id = f'appointment_{appointment_id}'
-        
-        record_hash = self.hash_builder.build_appointment_hash(appointment_data)
-        hash_payload = self.hash_builder.build_simple_hash_payload(record_hash)
-        
-        success, tx_id, error = self.fabric_client.add_record_hash(
-            record_id=record_id,
-            record_type=self.TYPE_APPOINTMENT,
-            patient_id=str(patient_id),
-            hash_payload=hash_payload,
-            metadata=metadata
-        )
-
-        if success:
-            created_by = metadata.get('createdBy') if metadata else None
-            _persist_to_db(self.TYPE_APPOINTMENT, appointment_id, record_id, tx_id, record_hash, created_by=created_by)
-
-        return {
-            'success': success,
-            'recordId': record_id,
-            'recordType': self.TYPE_APPOINTMENT,
-            'hash': record_hash,
-            'transactionId': tx_id if success else None,
-            'error': error if not success else None,
-            'timestamp': datetime.utcnow().isoformat() + 'Z'
-        }
+        return self._store_record(self.TYPE_APPOINTMENT, appointment_id, patient_id,
+                                  appointment_data, self.hash_builder.build_appointment_hash,
+                                  metadata=metadata)
 
     def verify_appointment(self, appointment_id: int, appointment_data: Dict[str, Any]) -> Dict[str, Any]:
         """Verify appointment record integrity."""
@@ -311,65 +480,64 @@ class BlockchainService:
         report_id: int,
         patient_id: int,
         report_data: Dict[str, Any],
-        file_data: Optional[bytes] = None,
+        file_data: Optional[Any] = None,
         filename: Optional[str] = None,
         upload_to_ipfs: bool = True,
         metadata: Optional[Dict[str, Any]] = None
     ) -> Dict[str, Any]:
         """
         Store report record on blockchain with optional file handling.
-        
+
         For reports with files:
         1. Encrypt file
         2. Upload encrypted file to IPFS
         3. Hash both form data and file
         4. Store combined hash payload on blockchain
-        
+
         Args:
             report_id: Report database ID
             patient_id: Patient ID
             report_data: Report form data
-            file_data: Optional file bytes
+            file_data: Optional file bytes or binary file-like object.
+                File-like objects are hashed and encrypted in one chunked
+                pass so the plaintext is never fully held in memory.
             filename: Original filename
             upload_to_ipfs: Whether to upload file to IPFS
             metadata: Optional metadata
-            
+
         Returns:
             Result with blockchain and IPFS details
         """
         record_id = f'report_{report_id}'
-        
-        # Calculate form hash
-        form_hash = self.hash_builder.build_report_form_hash(report_data)
-        
+
         file_hash = None
         ipfs_hash = None
         encryption_iv = None
-        
-        # Handle file if provided
-        if file_data and filename:
-            # Calculate file hash before encryption
-            file_hash = self.hash_builder.generate_file_hash(file_data)
-            
-            if upload_to_ipfs:
-                # Encrypt file
-                encrypted_data, encryption_iv = self.encryption_service.encrypt_for_storage(file_data)
-                
-                # Upload to IPFS
-                success, ipfs_hash, ipfs_error = self.ipfs_client.upload_file(
-                    encrypted_data,
-                    f'{filename}.enc',
-                    metadata={'reportId': str(report_id), 'patientId': str(patient_id)}
-                )
-                
-                if not success:
-                    return {
-                        'success': False,
-                        'recordId': record_id,
-                        'error': f'IPFS upload failed: {ipfs_error}',
-                        'timestamp': datetime.utcnow().isoformat() + 'Z'
-                    }
-        
+        file_future = None
+
+        # Kick off encrypt + IPFS upload on the I/O pool so the network
+        # round trip overlaps with form hashing on this thread
+        if file_data is not None and filename:
+            file_future = _io_executor.submit(
+                self._encrypt_and_upload,
+                report_id, patient_id, file_data, filename, upload_to_ipfs
+            )
+
+        # Calculate form hash
+        form_hash = self._build_record_hash(
+            self.TYPE_REPORT, report_id, report_data, self.hash_builder.build_report_form_hash)
+
+        if file_future is not None:
+            file_hash, ipfs_hash, encryption_iv, file_error = file_future.result()
+            if file_error:
+                return {
+                    'success': False,
+                    'recordId': record_id,
+                    'error': f'IPFS upload failed: {file_error}',
+                    'timestamp': _now_iso()
+                }
+
+
         # Build hash payload
         hash_payload = self.hash_builder.build_report_hash_payload(
             form_hash=form_hash,
@@ -393,7 +561,7 @@ class BlockchainService:
             'formHash': form_hash,
             'transactionId': tx_id if success else None,
             'error': error if not success else None,
-            'timestamp': datetime.utcnow().isoformat() + 'Z'
+            'timestamp': _now_iso()
         }
         
         if file_hash:
@@ -416,14 +584,59 @@ class BlockchainService:
             
         return result
 
+    def _encrypt_and_upload(
+        self,
+        report_id: int,
+        patient_id: int,
+        file_data: Any,
+        filename: str,
+        upload_to_ipfs: bool
+    ) -> Tuple[Optional[str], Optional[str], Optional[str], str]:
+        """
+        Hash, encrypt, and upload a report file.
+        Runs on the I/O pool so it can overlap with form hashing.
+
+        Returns:
+            Tuple of (file_hash, ipfs_hash, encryption_iv, error_message)
+        """
+        is_stream = hasattr(file_data, 'read')
+
+        if not upload_to_ipfs:
+            # generate_file_hash handles bytes and file objects alike
+            return self.hash_builder.generate_file_hash(file_data), None, None, ''
+
+        upload_metadata = {'reportId': str(report_id), 'patientId': str(patient_id)}
+
+        if is_stream:
+            # Hash + encrypt in one fused pass into a spooled temp file:
+            # small ciphertexts stay in memory, large ones spill to disk,
+            # and the multipart upload streams from it so peak RSS never
+            # includes the whole encrypted file.
+            with tempfile.SpooledTemporaryFile(max_size=_SPOOL_MAX_MEMORY) as spool:
+                nonce, file_hash = self.encryption_service.encrypt_stream_to(file_data, spool)
+                encryption_iv = nonce.hex()
+                spool.seek(0)
+                success, ipfs_hash, ipfs_error = self.ipfs_client.upload_file_stream(
+                    spool, f'{filename}.enc', metadata=upload_metadata)
+        else:
+            file_hash = self.hash_builder.generate_file_hash(file_data)
+            encrypted_data, encryption_iv = self.encryption_service.encrypt_for_storage(file_data)
+            success, ipfs_hash, ipfs_error = self.ipfs_client.upload_file(
+                encrypted_data, f'{filename}.enc', metadata=upload_metadata)
+
+        if not success:
+            return file_hash, None, encryption_iv, ipfs_error or 'upload failed'
+        return file_hash, ipfs_hash, encryption_iv, ''
+
     def verify_report(
         self,
         report_id: int,
         report_data: Dict[str, Any],
-        file_data: Optional[bytes] = None
+        file_data: Optional[bytes] = None,
+        file_hash: Optional[str] = None
     ) -> Dict[str, Any]:
         """Verify report record integrity."""
-        return self.integrity_service.verify_report(report_id, report_data, file_data)
+        return self.integrity_service.verify_report(report_id, report_data, file_data, file_hash)
 
     def download_report_file(self, ipfs_hash: str, encryption_iv: str) -> Tuple[bool, bytes, str]:
         """
@@ -436,18 +649,41 @@ class BlockchainService:
         Returns:
             Tuple of (success, decrypted_data, error_message)
         """
-        # Download from IPFS
-        success, encrypted_data, error = self.ipfs_client.download_file(ipfs_hash)
+        success, chunks, error = self.download_report_file_stream(ipfs_hash, encryption_iv)
         if not success:
             return False, b'', error
-        
-        # Decrypt
+
         try:
-            decrypted_data = self.encryption_service.decrypt_from_storage(encrypted_data, encryption_iv)
-            return True, decrypted_data, ''
+            return True, b''.join(chunks), ''
         except Exception as e:
             return False, b'', f'Decryption failed: {str(e)}'
 
+    def download_report_file_stream(self, ipfs_hash: str, encryption_iv: str):
+        """
+        Download and decrypt a report file as a stream of plaintext chunks,
+        so the encrypted and decrypted copies are never both fully in RAM.
+
+        Tampering is detected when the final chunk's GCM tag check fails,
+        so consumers must iterate to the end before trusting the data.
+
+        Args:
+            ipfs_hash: IPFS CID
+            encryption_iv: Nonce used during encryption (hex string)
+
+        Returns:
+            Tuple of (success, plaintext_chunk_iterator_or_None, error_message)
+        """
+        success, chunks, error = self.ipfs_client.download_file_stream(ipfs_hash)
+        if not success:
+            return False, None, error
+
+        try:
+            nonce = bytes.fromhex(encryption_iv)
+        except ValueError:
+            return False, None, 'Invalid encryption IV'
+
+        return True, self.encryption_service.decrypt_stream(chunks, nonce), ''
+
     # =====================================================
     # AUDIT & QUERY OPERATIONS
     # =====================================================
@@ -466,17 +702,11 @@ class BlockchainService:
             'fabricConnected': self.fabric_client.is_configured(),
             'ipfsConnected': self.ipfs_client.is_configured(),
             'simulationMode': self.fabric_client.simulation_mode,
-            'timestamp': datetime.utcnow().isoformat() + 'Z'
+            'timestamp': _now_iso()
         }
 
 
-# Singleton instance
-_blockchain_service = None
-
-
+@cache
 def get_blockchain_service() -> BlockchainService:
     """Get singleton blockchain service instance."""
-    global _blockchain_service
-    if _blockchain_service is None:
-        _blockchain_service = BlockchainService()
-    return _blockchain_service
+    return BlockchainService()
@@ -5,163 +5,284 @@ AES-256 encryption/decryption for report files before IPFS upload.
 
 import os
 import base64
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+import binascii
+import hashlib
+from functools import cache
 from cryptography.hazmat.primitives import padding
-from cryptography.hazmat.backends import default_backend
-from typing import Tuple
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from typing import BinaryIO, Tuple
 from ..config import Config
 
 
+def _load_master_key() -> bytes:
+    """
+    Decode the master key from config once at import time.
+
+    A missing or malformed key raises immediately outside simulation
+    mode: falling back to os.urandom would give every Flask worker a
+    different key, making files encrypted by one worker undecryptable
+    by the others.
+    """
+    key_hex = getattr(Config, 'ENCRYPTION_KEY', '')
+    if key_hex:
+        try:
+            key = bytes.fromhex(key_hex)
+        except ValueError:
+            raise RuntimeError('ENCRYPTION_KEY must be a hex string (64 hex chars = 256 bits)')
+        if len(key) != 32:
+            raise RuntimeError('ENCRYPTION_KEY must be 64 hex chars (256 bits)')
+        return key
+
+    if not getattr(Config, 'BLOCKCHAIN_SIMULATION_MODE', True):
+        raise RuntimeError(
+            'ENCRYPTION_KEY is not set. Generate one with generate_encryption_key() '
+            'and set it in the environment before running without simulation mode.'
+        )
+
+    # Development fallback: per-process random key (simulation mode only)
+    return os.urandom(32)
+
+
+# Decoded once per process; all EncryptionService instances share it
+_MASTER_KEY = _load_master_key()
+
+# Pre-registered cipher contexts for the master key, shared process-wide.
+# pyca/cryptography exposes no way to reset an EVP context between calls,
+# but constructing these once per process (instead of per service or per
+# call) keeps the Python-side object graph out of the hot path.
+_AESGCM = AESGCM(_MASTER_KEY)
+_AES_ALGORITHM = algorithms.AES(_MASTER_KEY)
+
+
 class EncryptionService:
     """
-    AES-256-CBC encryption service for report files.
-    Uses a master key from configuration and generates per-file IVs.
+    AES-256-GCM encryption service for report files.
+    Uses a master key from configuration and generates per-file nonces.
+    GCM authenticates the ciphertext, so tampered downloads fail to decrypt.
     """
 
-    BLOCK_SIZE = 16  # AES block size in bytes
+    NONCE_SIZE = 12  # Recommended GCM nonce size in bytes
+    LEGACY_IV_SIZE = 16  # CBC IV size; identifies files from the pre-GCM scheme
     KEY_SIZE = 32    # 256 bits
+    CHUNK_SIZE = 1024 * 1024  # Streaming read size (1 MiB)
 
     def __init__(self):
-        """Initialize encryption service with master key from config."""
-        self.master_key = self._load_or_generate_key()
-
-    def _load_or_generate_key(self) -> bytes:
-        """Load encryption key from config or generate new one."""
-        key_hex = getattr(Config, 'ENCRYPTION_KEY', None)
-        if key_hex:
-            try:
-                return bytes.fromhex(key_hex)
-            except ValueError:
-                pass
-        
-        # Generate a new key (should be saved to config in production)
-        # WARNING: In production, this key MUST be persistent!
-        return os.urandom(self.KEY_SIZE)
+        """Initialize encryption service with the module-level master key."""
+        self.master_key = _MASTER_KEY
+        # Bind the process-wide cipher contexts; only the nonce changes
+        # per file, so nothing key-dependent is rebuilt per call.
+        self._aesgcm = _AESGCM
+        self._algorithm = _AES_ALGORITHM
 
     def encrypt_file(self, file_data: bytes) -> Tuple[bytes, bytes]:
         """
-        Encrypt file data using AES-256-CBC.
-        
+        Encrypt file data using AES-256-GCM.
+
         Args:
             file_data: Raw file bytes to encrypt
-            
+
         Returns:
-            Tuple of (encrypted_data, iv)
+            Tuple of (encrypted_data, nonce)
         """
-        # Generate random IV for this file
-        iv = os.urandom(self.BLOCK_SIZE)
+        # Generate random nonce for this file
+        nonce = os.urandom(self.NONCE_SIZE)
 
-        # Pad data to block size
-        padder = padding.PKCS7(self.BLOCK_SIZE * 8).padder()
-        padded_data = padder.update(file_data) + padder.finalize()
+        # One-shot authenticated encryption (no padding pass; the GCM
+        # tag is appended to the ciphertext by the backend)
+        encrypted = self._aesgcm.encrypt(nonce, file_data, None)
 
-        # Encrypt
-        cipher = Cipher(
-            algorithms.AES(self.master_key),
-            modes.CBC(iv),
-            backend=default_backend()
-        )
-        encryptor = cipher.encryptor()
-        encrypted = encryptor.update(padded_data) + encryptor.finalize()
-
-        return encrypted, iv
+        return encrypted, nonce
 
-    def decrypt_file(self, encrypted_data: bytes, iv: bytes) -> bytes:
+    def decrypt_file(self, encrypted_data: bytes, nonce: bytes) -> bytes:
         """
-        Decrypt file data using AES-256-CBC.
-        
+        Decrypt file data using AES-256-GCM.
+
+        Files written before the GCM switch carry a 16-byte CBC IV
+        instead of a 12-byte nonce; those are routed to the legacy
+        CBC+PKCS7 path so existing uploads stay readable.
+
         Args:
-            encrypted_data: Encrypted file bytes
-            iv: Initialization vector used during encryption
-            
+            encrypted_data: Encrypted file bytes (with appended GCM tag)
+            nonce: Nonce used during encryption
+
         Returns:
             Decrypted file bytes
+
+        Raises:
+            cryptography.exceptions.InvalidTag: If the data was tampered with
         """
-        # Decrypt
-        cipher = Cipher(
-            algorithms.AES(self.master_key),
-            modes.CBC(iv),
-            backend=default_backend()
-        )
-        decryptor = cipher.decryptor()
-        padded_data = decryptor.update(encrypted_data) + decryptor.finalize()
+        if len(nonce) == self.LEGACY_IV_SIZE:
+            return self._decrypt_file_cbc(encrypted_data, nonce)
+        return self._aesgcm.decrypt(nonce, encrypted_data, None)
+
+    def _decrypt_file_cbc(self, encrypted_data: bytes, iv: bytes) -> bytes:
+        """Decrypt data written by the pre-GCM AES-256-CBC+PKCS7 scheme."""
+        decryptor = Cipher(self._algorithm, modes.CBC(iv)).decryptor()
+        padded = decryptor.update(encrypted_data) + decryptor.finalize()
+        unpadder = padding.PKCS7(self.LEGACY_IV_SIZE * 8).unpadder()
+        return unpadder.update(padded) + unpadder.finalize()
+
+    def encrypt_stream(self, fileobj: BinaryIO) -> Tuple[bytes, bytes, str]:
+        """
+        Encrypt a binary stream in a single chunked pass, fusing the
+        plaintext SHA-256 hash into the same loop so large report files
+        are never held fully in memory as plaintext.
+
+        The output is byte-identical to encrypt_file (ciphertext with
+        the GCM tag appended), so decrypt_file works on either.
+
+        Args:
+            fileobj: Binary file-like object to read from
 
-        # Remove padding
-        unpadder = padding.PKCS7(self.BLOCK_SIZE * 8).unpadder()
-        data = unpadder.update(padded_data) + unpadder.finalize()
+        Returns:
+            Tuple of (encrypted_data, nonce, plaintext_sha256_hexdigest)
+        """
+        nonce = os.urandom(self.NONCE_SIZE)
+        encryptor = Cipher(self._algorithm, modes.GCM(nonce)).encryptor()
+        hasher = hashlib.sha256()
+
+        chunks = []
+        while True:
+            chunk = fileobj.read(self.CHUNK_SIZE)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            chunks.append(encryptor.update(chunk))
+        chunks.append(encryptor.finalize())
+        chunks.append(encryptor.tag)
+
+        return b''.join(chunks), nonce, hasher.hexdigest()
+
+    def encrypt_stream_to(self, fileobj: BinaryIO, out: BinaryIO) -> Tuple[bytes, str]:
+        """
+        Encrypt a binary stream into a writable file object in one
+        chunked pass, fusing the plaintext SHA-256 hash into the same
+        loop. The bytes written match encrypt_stream (ciphertext with
+        the GCM tag appended), so decrypt_file and decrypt_stream both
+        work on the result; unlike encrypt_stream, the ciphertext is
+        never held in memory as a whole.
+
+        Args:
+            fileobj: Binary file-like object to read plaintext from
+            out: Binary file-like object to write ciphertext to
+
+        Returns:
+            Tuple of (nonce, plaintext_sha256_hexdigest)
+        """
+        nonce = os.urandom(self.NONCE_SIZE)
+        encryptor = Cipher(self._algorithm, modes.GCM(nonce)).encryptor()
+        hasher = hashlib.sha256()
+
+        while True:
+            chunk = fileobj.read(self.CHUNK_SIZE)
+            if not chunk:
+                break
+            hasher.update(chunk)
+            out.write(encryptor.update(chunk))
+        out.write(encryptor.finalize())
+        out.write(encryptor.tag)
+
+        return nonce, hasher.hexdigest()
+
+    def decrypt_stream(self, chunks, nonce: bytes):
+        """
+        Decrypt a stream of ciphertext chunks, yielding plaintext chunks.
 
-        return data
+        The final 16 bytes of the stream are the GCM tag, so that much is
+        held back until the stream ends and then verified; tampering
+        raises cryptography.exceptions.InvalidTag after the last chunk.
+        A 16-byte value means a legacy CBC IV and takes the compat path.
+
+        Args:
+            chunks: Iterable of ciphertext byte chunks (tag appended)
+            nonce: Nonce used during encryption
+        """
+        if len(nonce) == self.LEGACY_IV_SIZE:
+            yield from self._decrypt_stream_cbc(chunks, nonce)
+            return
+        decryptor = Cipher(self._algorithm, modes.GCM(nonce)).decryptor()
+        pending = b''
+        for chunk in chunks:
+            pending += chunk
+            if len(pending) > 16:
+                yield decryptor.update(pending[:-16])
+                pending = pending[-16:]
+        yield decryptor.finalize_with_tag(pending)
+
+    def _decrypt_stream_cbc(self, chunks, iv: bytes):
+        """Streaming decrypt for files written by the pre-GCM CBC scheme."""
+        decryptor = Cipher(self._algorithm, modes.CBC(iv)).decryptor()
+        unpadder = padding.PKCS7(self.LEGACY_IV_SIZE * 8).unpadder()
+        for chunk in chunks:
+            yield unpadder.update(decryptor.update(chunk))
+        yield unpadder.update(decryptor.finalize()) + unpadder.finalize()
 
     def encrypt_and_encode(self, file_data: bytes) -> str:
         """
-        Encrypt file and return base64-encoded result with IV prepended.
-        
+        Encrypt file and return base64-encoded result with nonce prepended.
+
         Args:
             file_data: Raw file bytes
-            
+
         Returns:
-            Base64-encoded string with format: base64(IV + encrypted_data)
+            Base64-encoded string with format: base64(nonce + encrypted_data)
         """
-        encrypted, iv = self.encrypt_file(file_data)
-        # Prepend IV to encrypted data
-        combined = iv + encrypted
+        encrypted, nonce = self.encrypt_file(file_data)
+        # Prepend nonce to encrypted data
+        combined = nonce + encrypted
         return base64.b64encode(combined).decode('utf-8')
 
     def decode_and_decrypt(self, encoded_data: str) -> bytes:
         """
         Decode base64 data and decrypt file.
-        
+
         Args:
-            encoded_data: Base64-encoded string with IV prepended
-            
+            encoded_data: Base64-encoded string with nonce prepended
+
         Returns:
             Decrypted file bytes
         """
         combined = base64.b64decode(encoded_data)
-        # Extract IV and encrypted data
-        iv = combined[:self.BLOCK_SIZE]
-        encrypted = combined[self.BLOCK_SIZE:]
-        return self.decrypt_file(encrypted, iv)
+        # Extract nonce and encrypted data
+        nonce = combined[:self.NONCE_SIZE]
+        encrypted = combined[self.NONCE_SIZE:]
+        return self.decrypt_file(encrypted, nonce)
 
     def encrypt_for_storage(self, file_data: bytes) -> Tuple[bytes, str]:
         """
-        Encrypt file and return encrypted bytes and IV as hex string.
-        Use this when storing IV separately.
-        
+        Encrypt file and return encrypted bytes and nonce as hex string.
+        Use this when storing the nonce separately (the encryption_iv
+        column keeps its name for schema compatibility).
+
         Args:
             file_data: Raw file bytes
-            
+
         Returns:
-            Tuple of (encrypted_bytes, iv_hex_string)
+            Tuple of (encrypted_bytes, nonce_hex_string)
         """
-        encrypted, iv = self.encrypt_file(file_data)
-        return encrypted, iv.hex()
+        encrypted, nonce = self.encrypt_file(file_data)
+        return encrypted, binascii.hexlify(nonce).decode('ascii')
 
     def decrypt_from_storage(self, encrypted_data: bytes, iv_hex: str) -> bytes:
         """
-        Decrypt file using separately stored IV.
-        
+        Decrypt file using separately stored nonce.
+
         Args:
             encrypted_data: Encrypted file bytes
-            iv_hex: IV as hex string
-            
+            iv_hex: Nonce as hex string
+
         Returns:
             Decrypted file bytes
         """
-        iv = bytes.fromhex(iv_hex)
-        return self.decrypt_file(encrypted_data, iv)
-
-
-# Singleton instance
-_encryption_service = None
+        nonce = binascii.unhexlify(iv_hex)
+        return self.decrypt_file(encrypted_data, nonce)
 
 
+@cache
 def get_encryption_service() -> EncryptionService:
     """Get singleton encryption service instance."""
-    global _encryption_service
-    if _encryption_service is None:
-        _encryption_service = EncryptionService()
-    return _encryption_service
+    return EncryptionService()
 
 
 def generate_encryption_key() -> str:
@@ -5,12 +5,41 @@ Handles connection to Fabric network and transaction submission.
 
 import json
 import os
+import secrets
 import subprocess
 import tempfile
+import time
+from collections import defaultdict, deque
+from functools import cache
 from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime
 from ..config import Config
 
+try:
+    # orjson serializes to UTF-8 bytes in native code; chaincode args and
+    # query responses are small JSON, so encode/decode cost is a visible
+    # slice of every submission.
+    import orjson
+
+    def _dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode('utf-8')
+
+    _loads = orjson.loads
+except ImportError:  # pragma: no cover - fallback when orjson is absent
+    _dumps = json.dumps
+    _loads = json.loads
+
+
+def _make_tx_id(prefix: str = 'sim') -> str:
+    """
+    Generate a locally unique transaction ID.
+
+    time_ns is a single clock read and token_hex returns a string
+    directly, which keeps this off the datetime-formatting path in
+    simulation-mode load tests.
+    """
+    return f'{prefix}-{time.time_ns():x}-{secrets.token_hex(4)}'
+
 
 class FabricClient:
     """
@@ -36,6 +65,21 @@ class FabricClient:
         # Simulation mode for development
         self.simulation_mode = getattr(Config, 'BLOCKCHAIN_SIMULATION_MODE', True)
         self._simulated_ledger = {}
+        # Ring-buffer cap on per-record history so long simulation runs
+        # (load tests re-storing the same records) stay bounded in memory
+        self._history_cap = getattr(Config, 'SIM_HISTORY_CAP', 256)
+        # Secondary indexes so by-patient/by-type queries read only their
+        # matching record IDs instead of scanning the whole ledger
+        self._by_patient = defaultdict(set)
+        self._by_type = defaultdict(set)
+
+        # Static peer CLI prefixes; only the -c payload varies per call
+        base = ['peer', 'chaincode']
+        common = ['-C', self.channel_name, '-n', self.chaincode_name]
+        self._query_prefix = [*base, 'query', *common]
+        self._invoke_prefix = [*base, 'invoke', *common, '-o', self.orderer_endpoint]
+        if self.tls_enabled:
+            self._invoke_prefix += ['--tls', '--cafile', self.tls_cert_path]
 
     def is_configured(self) -> bool:
         """Check if Fabric client is properly configured."""
@@ -79,11 +123,46 @@ class FabricClient:
             record_id,
             record_type,
             patient_id,
-            json.dumps(hash_payload),
-            json.dumps(metadata or {})
+            _dumps(hash_payload),
+            _dumps(metadata or {})
         ]
         return self._invoke_chaincode(args)
 
+    def add_record_hashes_batch(
+        self,
+        records: List[Tuple[str, str, str, Dict[str, Any], Optional[Dict[str, Any]]]]
+    ) -> Tuple[bool, str, str]:
+        """
+        Add multiple record hashes in a single transaction.
+
+        Bulk flows (seed data, imports) paying one orderer round trip per
+        record serialize on network latency; submitting the whole batch as
+        one chaincode invocation amortizes that round trip across N records.
+
+        Args:
+            records: List of (record_id, record_type, patient_id,
+                hash_payload, metadata) tuples
+
+        Returns:
+            Tuple of (success, transaction_id, error_message) — the last
+            transaction ID in real mode, where the batch is submitted
+            record by record
+        """
+        if self.simulation_mode:
+            return self._simulate_add_records_batch(records)
+
+        # The in-repo chaincode only exposes AddRecordHash, so real mode
+        # falls back to one invocation per record; the batch still saves
+        # the callers' per-record Python overhead, and a failure aborts
+        # before the remaining records are submitted.
+        tx_id = ''
+        for record_id, record_type, patient_id, hash_payload, metadata in records:
+            success, tx_id, error = self.add_record_hash(
+                record_id, record_type, patient_id, hash_payload, metadata)
+            if not success:
+                return False, '', error
+        return True, tx_id, ''
+
     def get_record_hash(self, record_id: str) -> Tuple[bool, Optional[Dict[str, Any]], str]:
         """
         Get a record hash from the blockchain.
@@ -101,11 +180,43 @@ class FabricClient:
         success, result, error = self._query_chaincode(args)
         if success and result:
             try:
-                return True, json.loads(result), ''
-            except json.JSONDecodeError:
+                return True, _loads(result), ''
+            except ValueError:
                 return False, None, 'Invalid JSON response from chaincode'
         return success, None, error
 
+    def get_record_hashes_bulk(
+        self, record_ids: List[str]
+    ) -> Tuple[bool, Dict[str, Optional[Dict[str, Any]]], str]:
+        """
+        Get multiple record hashes in one query.
+
+        Batch verification paying one ledger round trip per record
+        serializes on network latency; this fetches the whole set at
+        once. Missing records map to None rather than failing the call.
+
+        Args:
+            record_ids: Record identifiers to fetch
+
+        Returns:
+            Tuple of (success, {record_id: record_data_or_None}, error)
+        """
+        if self.simulation_mode:
+            ledger = self._simulated_ledger
+            return True, {
+                rid: entry['current'] if (entry := ledger.get(rid)) else None
+                for rid in record_ids
+            }, ''
+
+        # The in-repo chaincode only exposes GetRecordHash, so real mode
+        # queries record by record; lookup misses become None entries,
+        # matching the simulation path's shape.
+        results = {}
+        for rid in record_ids:
+            success, record, _error = self.get_record_hash(rid)
+            results[rid] = record if success else None
+        return True, results, ''
+
     def get_record_history(self, record_id: str) -> Tuple[bool, List[Dict[str, Any]], str]:
         """
         Get the history of all changes to a record.
@@ -123,8 +234,8 @@ class FabricClient:
         success, result, error = self._query_chaincode(args)
         if success and result:
             try:
-                return True, json.loads(result), ''
-            except json.JSONDecodeError:
+                return True, _loads(result), ''
+            except ValueError:
                 return False, [], 'Invalid JSON response from chaincode'
         return success, [], error
 
@@ -146,9 +257,9 @@ class FabricClient:
         success, result, error = self._query_chaincode(args)
         if success and result:
             try:
-                data = json.loads(result)
+                data = _loads(result)
                 return True, data.get('isValid', False), ''
-            except json.JSONDecodeError:
+            except ValueError:
                 return False, False, 'Invalid JSON response from chaincode'
         return success, False, error
 
@@ -169,8 +280,8 @@ class FabricClient:
         success, result, error = self._query_chaincode(args)
         if success and result:
             try:
-                return True, json.loads(result), ''
-            except json.JSONDecodeError:
+                return True, _loads(result), ''
+            except ValueError:
                 return False, [], 'Invalid JSON response from chaincode'
         return success, [], error
 
@@ -191,8 +302,8 @@ class FabricClient:
         success, result, error = self._query_chaincode(args)
         if success and result:
             try:
-                return True, json.loads(result), ''
-            except json.JSONDecodeError:
+                return True, _loads(result), ''
+            except ValueError:
                 return False, [], 'Invalid JSON response from chaincode'
         return success, [], error
 
@@ -247,20 +358,9 @@ class FabricClient:
             return False, '', f'Chaincode query error: {str(e)}'
 
     def _build_peer_command(self, command: str, args: List[str]) -> List[str]:
-        """Build peer CLI command."""
-        cmd = [
-            'peer', 'chaincode', command,
-            '-C', self.channel_name,
-            '-n', self.chaincode_name,
-            '-c', json.dumps({'function': args[0], 'Args': args[1:]})
-        ]
-        
-        if command == 'invoke':
-            cmd.extend(['-o', self.orderer_endpoint])
-            if self.tls_enabled:
-                cmd.extend(['--tls', '--cafile', self.tls_cert_path])
-
-        return cmd
+        """Build peer CLI command from the precomputed prefix."""
+        prefix = self._invoke_prefix if command == 'invoke' else self._query_prefix
+        return [*prefix, '-c', _dumps({'function': args[0], 'Args': args[1:]})]
 
     def _extract_tx_id(self, output: str) -> str:
         """Extract transaction ID from peer CLI output."""
@@ -271,12 +371,26 @@ class FabricClient:
             for i, part in enumerate(parts):
                 if 'txid' in part.lower() and i + 1 < len(parts):
                     return parts[i + 1].strip('[]')
-        return datetime.utcnow().strftime('%Y%m%d%H%M%S') + '-' + os.urandom(8).hex()
+        return _make_tx_id('tx')
 
     # =====================================================
     # SIMULATION MODE (for development)
     # =====================================================
 
+    def _ledger_put(self, record_id: str, record: Dict[str, Any]):
+        """Store a record version and keep the secondary indexes current."""
+        entry = self._simulated_ledger.get(record_id)
+        if entry is None:
+            self._simulated_ledger[record_id] = {
+                'current': record,
+                'history': deque(maxlen=self._history_cap)
+            }
+        else:
+            entry['history'].append(entry['current'])
+            entry['current'] = record
+        self._by_patient[record['patientID']].add(record_id)
+        self._by_type[record['recordType']].add(record_id)
+
     def _simulate_add_record(
         self,
         record_id: str,
@@ -287,8 +401,8 @@ class FabricClient:
     ) -> Tuple[bool, str, str]:
         """Simulate adding record to ledger (development mode)."""
         timestamp = datetime.utcnow().isoformat() + 'Z'
-        tx_id = f'sim-{datetime.utcnow().strftime("%Y%m%d%H%M%S")}-{os.urandom(4).hex()}'
-        
+        tx_id = _make_tx_id()
+
         record = {
             'recordID': record_id,
             'recordType': record_type,
@@ -298,16 +412,32 @@ class FabricClient:
             'timestamp': timestamp,
             'txID': tx_id
         }
-        
+
         # Store in simulated ledger with history
-        if record_id not in self._simulated_ledger:
-            self._simulated_ledger[record_id] = {'current': record, 'history': []}
-        else:
-            self._simulated_ledger[record_id]['history'].append(
-                self._simulated_ledger[record_id]['current']
-            )
-            self._simulated_ledger[record_id]['current'] = record
-        
+        self._ledger_put(record_id, record)
+
+        return True, tx_id, ''
+
+    def _simulate_add_records_batch(
+        self,
+        records: List[Tuple[str, str, str, Dict[str, Any], Optional[Dict[str, Any]]]]
+    ) -> Tuple[bool, str, str]:
+        """Simulate adding a batch of records under one transaction ID."""
+        timestamp = datetime.utcnow().isoformat() + 'Z'
+        tx_id = _make_tx_id()
+
+        for record_id, record_type, patient_id, hash_payload, metadata in records:
+            record = {
+                'recordID': record_id,
+                'recordType': record_type,
+                'patientID': patient_id,
+                'hashPayload': hash_payload,
+                'metadata': metadata or {},
+                'timestamp': timestamp,
+                'txID': tx_id
+            }
+            self._ledger_put(record_id, record)
+
         return True, tx_id, ''
 
     def _simulate_get_record(self, record_id: str) -> Tuple[bool, Optional[Dict[str, Any]], str]:
@@ -320,7 +450,7 @@ class FabricClient:
         """Simulate getting record history."""
         if record_id in self._simulated_ledger:
             ledger_entry = self._simulated_ledger[record_id]
-            history = ledger_entry['history'] + [ledger_entry['current']]
+            history = [*ledger_entry['history'], ledger_entry['current']]
             return True, history, ''
         return False, [], 'Record not found'
 
@@ -336,28 +466,16 @@ class FabricClient:
 
     def _simulate_get_by_patient(self, patient_id: str) -> Tuple[bool, List[Dict[str, Any]], str]:
         """Simulate getting records by patient ID."""
-        records = []
-        for record_id, entry in self._simulated_ledger.items():
-            if entry['current'].get('patientID') == patient_id:
-                records.append(entry['current'])
-        return True, records, ''
+        record_ids = self._by_patient.get(patient_id, ())
+        return True, [self._simulated_ledger[rid]['current'] for rid in record_ids], ''
 
     def _simulate_get_by_type(self, record_type: str) -> Tuple[bool, List[Dict[str, Any]], str]:
         """Simulate getting records by type."""
-        records = []
-        for record_id, entry in self._simulated_ledger.items():
-            if entry['current'].get('recordType') == record_type:
-                records.append(entry['current'])
-        return True, records, ''
-
-
-# Singleton instance
-_fabric_client = None
+        record_ids = self._by_type.get(record_type, ())
+        return True, [self._simulated_ledger[rid]['current'] for rid in record_ids], ''
 
 
+@cache
 def get_fabric_client() -> FabricClient:
     """Get singleton Fabric client instance."""
-    global _fabric_client
-    if _fabric_client is None:
-        _fabric_client = FabricClient()
-    return _fabric_client
+    return FabricClient()
@@ -5,9 +5,64 @@ Builds canonical strings and generates SHA-256 hashes for medical records.
 
 import hashlib
 import json
+from functools import lru_cache
 from typing import Any, Dict, List, Optional
 
 
+# Field orders are part of the hash format: reordering or renaming any
+# entry changes digests for existing records. Module-level tuples so the
+# build methods don't rebuild the lists per call.
+_PATIENT_FIELDS = (
+    'mrn', 'first_name', 'last_name', 'date_of_birth', 'gender',
+    'phone', 'email', 'national_id', 'blood_group', 'address_line1',
+    'city', 'state', 'postal_code', 'country'
+)
+_VISIT_FIELDS = (
+    'patient_id', 'doctor_id', 'department_id', 'visit_type',
+    'admission_date', 'chief_complaint', 'room_number', 'bed_number',
+    'ward', 'status'
+)
+_PRESCRIPTION_FIELDS = ('patient_id', 'doctor_id', 'visit_id', 'notes', 'prescription_date')
+_MEDICATION_FIELDS = ('medicine_name', 'dosage', 'frequency', 'duration', 'instructions', 'quantity')
+_INVOICE_FIELDS = ('patient_id', 'visit_id', 'invoice_number', 'due_date', 'notes', 'invoice_date')
+_INVOICE_ITEM_FIELDS = ('category', 'description', 'quantity', 'unit_price')
+_APPOINTMENT_FIELDS = (
+    'patient_id', 'doctor_id', 'department_id', 'appointment_date',
+    'appointment_time', 'visit_type', 'reason', 'status'
+)
+_REPORT_FIELDS = (
+    'patient_id', 'visit_id', 'report_type', 'title', 'description',
+    'ordering_doctor_id', 'department_id', 'report_date', 'result_summary'
+)
+
+
+# Read-only view for callers that want to SELECT exactly the hashed
+# columns (the verification endpoints) instead of SELECT *. Keyed by the
+# record_type values used in record_blockchain_map.
+HASH_FIELDS = {
+    'PATIENT': _PATIENT_FIELDS,
+    'VISIT': _VISIT_FIELDS,
+    'PRESCRIPTION': _PRESCRIPTION_FIELDS,
+    'MEDICATION': _MEDICATION_FIELDS,
+    'INVOICE': _INVOICE_FIELDS,
+    'INVOICE_ITEM': _INVOICE_ITEM_FIELDS,
+    'APPOINTMENT': _APPOINTMENT_FIELDS,
+    'REPORT': _REPORT_FIELDS,
+}
+
+
+# Normalizers keyed on the exact value type. Keying on type() rather
+# than isinstance means bool can't be swallowed by the int entry, and
+# subclasses still take the general path.
+_FAST_NORMALIZE = {
+    str: str.strip,
+    bool: lambda v: "true" if v else "false",
+    int: str,
+    float: str,
+    type(None): lambda v: "",
+}
+
+
 class HashBuilder:
     """
     Builds deterministic canonical strings from record data and generates SHA-256 hashes.
@@ -17,13 +72,23 @@ class HashBuilder:
     @staticmethod
     def _normalize_value(value: Any) -> str:
         """Normalize a value to string for hashing."""
-        if value is None:
-            return ""
+        # Exact-type dispatch for the scalar cases: one C-level dict
+        # lookup instead of walking an isinstance chain per field. DB
+        # rows only ever yield these exact types, so the chain below is
+        # effectively just the container/subclass fallback.
+        fn = _FAST_NORMALIZE.get(type(value))
+        if fn is not None:
+            return fn(value)
         if isinstance(value, bool):
             return "true" if value else "false"
         if isinstance(value, (int, float)):
             return str(value)
         if isinstance(value, (list, dict)):
+            # Stays on stdlib json deliberately: orjson emits raw UTF-8
+            # where this escapes non-ASCII (ensure_ascii) and formats
+            # exponent floats differently (1e20 vs 1e+20), so swapping
+            # encoders would silently change digests for such values and
+            # break verification of hashes already on the ledger.
             return json.dumps(value, sort_keys=True, separators=(',', ':'))
         return str(value).strip()
 
@@ -46,8 +111,15 @@ class HashBuilder:
         return hashlib.sha256(data.encode('utf-8')).hexdigest()
 
     @staticmethod
-    def generate_file_hash(file_data: bytes) -> str:
-        """Generate SHA-256 hash of file bytes."""
+    def generate_file_hash(file_data) -> str:
+        """
+        Generate SHA-256 hash of file bytes or a binary file object.
+        Both paths hash in a single C-level call (file objects are read
+        in chunks inside hashlib.file_digest), so OpenSSL's hardware
+        SHA-256 runs without Python-loop overhead.
+        """
+        if hasattr(file_data, 'read'):
+            return hashlib.file_digest(file_data, 'sha256').hexdigest()
         return hashlib.sha256(file_data).hexdigest()
 
     # =====================================================
@@ -59,13 +131,10 @@ class HashBuilder:
         Build hash for patient record.
         Fields: mrn, first_name, last_name, date_of_birth, gender, phone, email, national_id
         """
-        field_order = [
-            'mrn', 'first_name', 'last_name', 'date_of_birth', 'gender',
-            'phone', 'email', 'national_id', 'blood_group', 'address_line1',
-            'city', 'state', 'postal_code', 'country'
-        ]
-        canonical = HashBuilder._build_canonical_string(patient, field_order)
-        return HashBuilder.generate_hash(canonical)
+        try:
+            return _patient_hash_cached(tuple(sorted(patient.items())))
+        except TypeError:  # unhashable value; hash without caching
+            return hashlib.sha256(_patient_canon(patient).encode('utf-8')).hexdigest()
 
     # =====================================================
     # VISIT HASH
@@ -77,13 +146,10 @@ class HashBuilder:
         Fields: patient_id, doctor_id, department_id, visit_type, admission_date, 
                 chief_complaint, room_number, bed_number
         """
-        field_order = [
-            'patient_id', 'doctor_id', 'department_id', 'visit_type',
-            'admission_date', 'chief_complaint', 'room_number', 'bed_number',
-            'ward', 'status'
-        ]
-        canonical = HashBuilder._build_canonical_string(visit, field_order)
-        return HashBuilder.generate_hash(canonical)
+        try:
+            return _visit_hash_cached(tuple(sorted(visit.items())))
+        except TypeError:  # unhashable value; hash without caching
+            return hashlib.sha256(_visit_canon(visit).encode('utf-8')).hexdigest()
 
     # =====================================================
     # PRESCRIPTION HASH
@@ -95,20 +161,12 @@ class HashBuilder:
         Fields: patient_id, doctor_id, visit_id, notes, prescription_date
         Plus: medications list (name, dosage, frequency, duration, instructions)
         """
-        # Build base fields
-        field_order = ['patient_id', 'doctor_id', 'visit_id', 'notes', 'prescription_date']
-        base_canonical = HashBuilder._build_canonical_string(prescription, field_order)
-
-        # Build medications canonical string
-        med_parts = []
-        for med in sorted(medications, key=lambda x: x.get('medicine_name', '')):
-            med_fields = ['medicine_name', 'dosage', 'frequency', 'duration', 'instructions', 'quantity']
-            med_canonical = HashBuilder._build_canonical_string(med, med_fields)
-            med_parts.append(med_canonical)
-
-        medications_str = ";".join(med_parts)
-        full_canonical = f"{base_canonical}|medications=[{medications_str}]"
-        return HashBuilder.generate_hash(full_canonical)
+        meds = ';'.join(
+            _medication_canon(med)
+            for med in sorted(medications, key=lambda x: x.get('medicine_name', ''))
+        )
+        canonical = f'{_prescription_canon(prescription)}|medications=[{meds}]'
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
 
     # =====================================================
     # BILLING / INVOICE HASH
@@ -120,19 +178,12 @@ class HashBuilder:
         Fields: patient_id, visit_id, invoice_number, due_date, notes
         Plus: line items (category, description, quantity, unit_price)
         """
-        field_order = ['patient_id', 'visit_id', 'invoice_number', 'due_date', 'notes', 'invoice_date']
-        base_canonical = HashBuilder._build_canonical_string(invoice, field_order)
-
-        # Build items canonical string
-        item_parts = []
-        for item in sorted(items, key=lambda x: (x.get('category', ''), x.get('description', ''))):
-            item_fields = ['category', 'description', 'quantity', 'unit_price']
-            item_canonical = HashBuilder._build_canonical_string(item, item_fields)
-            item_parts.append(item_canonical)
-
-        items_str = ";".join(item_parts)
-        full_canonical = f"{base_canonical}|items=[{items_str}]"
-        return HashBuilder.generate_hash(full_canonical)
+        lines = ';'.join(
+            _invoice_item_canon(item)
+            for item in sorted(items, key=lambda x: (x.get('category', ''), x.get('description', '')))
+        )
+        canonical = f'{_invoice_canon(invoice)}|items=[{lines}]'
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
 
     # =====================================================
     # APPOINTMENT HASH
@@ -143,12 +194,10 @@ class HashBuilder:
         Build hash for appointment record.
         Fields: patient_id, doctor_id, appointment_date, appointment_time, visit_type, reason
         """
-        field_order = [
-            'patient_id', 'doctor_id', 'department_id', 'appointment_date',
-            'appointment_time', 'visit_type', 'reason', 'status'
-        ]
-        canonical = HashBuilder._build_canonical_string(appointment, field_order)
-        return HashBuilder.generate_hash(canonical)
+        try:
+            return _appointment_hash_cached(tuple(sorted(appointment.items())))
+        except TypeError:  # unhashable value; hash without caching
+            return hashlib.sha256(_appointment_canon(appointment).encode('utf-8')).hexdigest()
 
     # =====================================================
     # REPORT HASH (Form fields only - separate from file)
@@ -160,12 +209,10 @@ class HashBuilder:
         Fields: patient_id, visit_id, report_type, title, description, 
                 ordering_doctor_id, department_id, report_date, result_summary
         """
-        field_order = [
-            'patient_id', 'visit_id', 'report_type', 'title', 'description',
-            'ordering_doctor_id', 'department_id', 'report_date', 'result_summary'
-        ]
-        canonical = HashBuilder._build_canonical_string(report, field_order)
-        return HashBuilder.generate_hash(canonical)
+        try:
+            return _report_form_hash_cached(tuple(sorted(report.items())))
+        except TypeError:  # unhashable value; hash without caching
+            return hashlib.sha256(_report_canon(report).encode('utf-8')).hexdigest()
 
     # =====================================================
     # COMBINED REPORT HASH PAYLOAD
@@ -195,3 +242,51 @@ class HashBuilder:
     def build_simple_hash_payload(hash_value: str) -> Dict[str, str]:
         """Build simple hash payload for form-only records."""
         return {'hash': hash_value}
+
+
+def _gen_canon(name: str, field_order) -> Any:
+    """
+    Generate a specialized canonical-string builder for a fixed field
+    order. The emitted function is a single flat f-string over
+    fields.get calls, so the generic per-field loop (and its bytecode
+    dispatch) disappears from the hash hot path. Output is identical to
+    _build_canonical_string for the same field order.
+    """
+    parts = '|'.join(f'{field}={{_n(g({field!r}))}}' for field in field_order)
+    source = (
+        f'def {name}(fields, _n=_normalize):\n'
+        f'    g = fields.get\n'
+        f'    return f{parts!r}\n'
+    )
+    namespace = {'_normalize': HashBuilder._normalize_value}
+    exec(source, namespace)
+    return namespace[name]
+
+
+_patient_canon = _gen_canon('_patient_canon', _PATIENT_FIELDS)
+_visit_canon = _gen_canon('_visit_canon', _VISIT_FIELDS)
+_prescription_canon = _gen_canon('_prescription_canon', _PRESCRIPTION_FIELDS)
+_medication_canon = _gen_canon('_medication_canon', _MEDICATION_FIELDS)
+_invoice_canon = _gen_canon('_invoice_canon', _INVOICE_FIELDS)
+_invoice_item_canon = _gen_canon('_invoice_item_canon', _INVOICE_ITEM_FIELDS)
+_appointment_canon = _gen_canon('_appointment_canon', _APPOINTMENT_FIELDS)
+_report_canon = _gen_canon('_report_canon', _REPORT_FIELDS)
+
+
+def _cached_flat_hash(canon):
+    """
+    Wrap a generated canonical builder in an LRU cache keyed on the
+    record's sorted (field, value) tuple. Retry loops and back-to-back
+    store+verify calls on the same row skip canonicalization and SHA-256
+    entirely. Hashing is pure, so entries never go stale.
+    """
+    @lru_cache(maxsize=4096)
+    def cached(items):
+        return hashlib.sha256(canon(dict(items)).encode('utf-8')).hexdigest()
+    return cached
+
+
+_patient_hash_cached = _cached_flat_hash(_patient_canon)
+_visit_hash_cached = _cached_flat_hash(_visit_canon)
+_appointment_hash_cached = _cached_flat_hash(_appointment_canon)
+_report_form_hash_cached = _cached_flat_hash(_report_canon)
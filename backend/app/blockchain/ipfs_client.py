@@ -4,11 +4,50 @@ Handles upload and download of encrypted files to/from IPFS.
 Supports Pinata, Infura, or local IPFS node.
 """
 
+import json
 import os
 import requests
+from functools import cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from typing import Optional, Tuple
 from ..config import Config
 
+try:
+    # Streams multipart bodies instead of assembling them in memory;
+    # optional, large uploads fall back to the buffered path without it.
+    from requests_toolbelt import MultipartEncoder
+except ImportError:  # pragma: no cover - fallback when toolbelt is absent
+    MultipartEncoder = None
+
+try:
+    # Native-code JSON for the pinata metadata blob and the small
+    # provider responses; per-call cost adds up across batch uploads.
+    import orjson
+
+    _dumps = orjson.dumps  # returns bytes, fine for a multipart field
+    _loads = orjson.loads
+except ImportError:  # pragma: no cover - fallback when orjson is absent
+    _dumps = json.dumps
+    _loads = json.loads
+
+
+# Process-wide session so repeated uploads/downloads reuse pooled
+# keep-alive connections instead of paying a TCP+TLS handshake per call.
+_session = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=64,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.1,
+        status_forcelist=[429, 502, 503, 504],
+        allowed_methods=None  # uploads are POSTs; retry those too
+    )
+)
+_session.mount('http://', _adapter)
+_session.mount('https://', _adapter)
+
 
 class IPFSClient:
     """
@@ -25,6 +64,74 @@ class IPFSClient:
         self.local_ipfs_url = getattr(Config, 'LOCAL_IPFS_URL', 'http://localhost:5001')
         self.ipfs_gateway = getattr(Config, 'IPFS_GATEWAY', 'https://gateway.pinata.cloud/ipfs/')
 
+        # Provider is fixed for the client's lifetime; bind the upload
+        # target once instead of string-comparing per call
+        self._uploader = {
+            'pinata': self._upload_to_pinata,
+            'infura': self._upload_to_infura,
+        }.get(self.provider, self._upload_to_local)
+
+        # Local disk cache for downloads. CIDs are content-addressed, so
+        # cached bytes can never go stale; eviction is purely by size.
+        self._cache_dir = getattr(Config, 'IPFS_CACHE_DIR',
+                                  os.path.join(getattr(Config, 'UPLOAD_FOLDER', '.'), 'ipfs_cache'))
+        self._cache_max_bytes = getattr(Config, 'IPFS_CACHE_MAX_BYTES', 5 * 1024 ** 3)
+        try:
+            os.makedirs(self._cache_dir, exist_ok=True)
+        except OSError:
+            self._cache_dir = None
+
+    def _cache_path(self, ipfs_hash: str) -> Optional[str]:
+        # CIDs are base58/base32 alphanumerics; anything else never
+        # touches the filesystem
+        if self._cache_dir and ipfs_hash.isalnum():
+            return os.path.join(self._cache_dir, ipfs_hash)
+        return None
+
+    def _cache_get(self, ipfs_hash: str) -> Optional[bytes]:
+        path = self._cache_path(ipfs_hash)
+        if path:
+            try:
+                with open(path, 'rb') as f:
+                    return f.read()
+            except OSError:
+                pass
+        return None
+
+    def _cache_put(self, ipfs_hash: str, data: bytes):
+        path = self._cache_path(ipfs_hash)
+        if not path:
+            return
+        try:
+            tmp_path = f'{path}.tmp.{os.getpid()}'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)  # atomic; concurrent readers see old or new
+            self._evict_cache()
+        except OSError:
+            pass
+
+    def _evict_cache(self):
+        """Drop least-recently-modified cache entries once over the size cap."""
+        try:
+            with os.scandir(self._cache_dir) as entries:
+                files = [(e.stat().st_mtime, e.stat().st_size, e.path)
+                         for e in entries if e.is_file()]
+        except OSError:
+            return
+        total = sum(size for _, size, _ in files)
+        if total <= self._cache_max_bytes:
+            return
+        files.sort()  # oldest first
+        for _, size, path in files:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self._cache_max_bytes:
+                break
+
     def upload_file(self, file_data: bytes, filename: str, metadata: Optional[dict] = None) -> Tuple[bool, str, str]:
         """
         Upload encrypted file to IPFS.
@@ -37,17 +144,10 @@ class IPFSClient:
         Returns:
             Tuple of (success, ipfs_hash, error_message)
         """
-        if self.provider == 'pinata':
-            return self._upload_to_pinata(file_data, filename, metadata)
-        elif self.provider == 'infura':
-            return self._upload_to_infura(file_data, filename)
-        else:
-            return self._upload_to_local(file_data, filename)
+        return self._uploader(file_data, filename, metadata)
 
     def _upload_to_pinata(self, file_data: bytes, filename: str, metadata: Optional[dict] = None) -> Tuple[bool, str, str]:
         """Upload to Pinata IPFS service."""
-        import json
-        
         if not self.pinata_api_key or not self.pinata_secret:
             return False, '', 'Pinata API credentials not configured'
 
@@ -67,12 +167,12 @@ class IPFSClient:
                 'name': filename,
                 'keyvalues': metadata
             }
-            files['pinataMetadata'] = (None, json.dumps(pinata_metadata), 'application/json')
+            files['pinataMetadata'] = (None, _dumps(pinata_metadata), 'application/json')
 
         try:
-            response = requests.post(url, headers=headers, files=files, timeout=60)
+            response = _session.post(url, headers=headers, files=files, timeout=60)
             if response.status_code == 200:
-                result = response.json()
+                result = _loads(response.content)
                 ipfs_hash = result.get('IpfsHash', '')
                 return True, ipfs_hash, ''
             else:
@@ -80,8 +180,8 @@ class IPFSClient:
         except requests.RequestException as e:
             return False, '', f'Pinata upload error: {str(e)}'
 
-    def _upload_to_infura(self, file_data: bytes, filename: str) -> Tuple[bool, str, str]:
-        """Upload to Infura IPFS service."""
+    def _upload_to_infura(self, file_data: bytes, filename: str, metadata: Optional[dict] = None) -> Tuple[bool, str, str]:
+        """Upload to Infura IPFS service (metadata unsupported, ignored)."""
         if not self.infura_project_id or not self.infura_project_secret:
             return False, '', 'Infura IPFS credentials not configured'
 
@@ -90,9 +190,9 @@ class IPFSClient:
         files = {'file': (filename, file_data)}
 
         try:
-            response = requests.post(url, auth=auth, files=files, timeout=60)
+            response = _session.post(url, auth=auth, files=files, timeout=60)
             if response.status_code == 200:
-                result = response.json()
+                result = _loads(response.content)
                 ipfs_hash = result.get('Hash', '')
                 return True, ipfs_hash, ''
             else:
@@ -100,15 +200,15 @@ class IPFSClient:
         except requests.RequestException as e:
             return False, '', f'Infura upload error: {str(e)}'
 
-    def _upload_to_local(self, file_data: bytes, filename: str) -> Tuple[bool, str, str]:
-        """Upload to local IPFS node."""
+    def _upload_to_local(self, file_data: bytes, filename: str, metadata: Optional[dict] = None) -> Tuple[bool, str, str]:
+        """Upload to local IPFS node (metadata unsupported, ignored)."""
         url = f'{self.local_ipfs_url}/api/v0/add'
         files = {'file': (filename, file_data)}
 
         try:
-            response = requests.post(url, files=files, timeout=60)
+            response = _session.post(url, files=files, timeout=60)
             if response.status_code == 200:
-                result = response.json()
+                result = _loads(response.content)
                 ipfs_hash = result.get('Hash', '')
                 return True, ipfs_hash, ''
             else:
@@ -116,6 +216,68 @@ class IPFSClient:
         except requests.RequestException as e:
             return False, '', f'Local IPFS upload error: {str(e)}'
 
+    def upload_file_stream(self, fileobj, filename: str, metadata: Optional[dict] = None) -> Tuple[bool, str, str]:
+        """
+        Upload a file-like object to IPFS, streaming the request body.
+
+        With requests_toolbelt installed the multipart body is encoded
+        on the fly, so peak memory stays at the read-chunk size instead
+        of the whole encrypted file; otherwise this falls back to the
+        buffered upload_file path.
+
+        Args:
+            fileobj: Binary file-like object positioned at the start
+            filename: Original filename
+            metadata: Optional metadata dict
+
+        Returns:
+            Tuple of (success, ipfs_hash, error_message)
+        """
+        if MultipartEncoder is None:
+            return self.upload_file(fileobj.read(), filename, metadata)
+
+        fields = {'file': (filename, fileobj, 'application/octet-stream')}
+
+        if self.provider == 'pinata':
+            if not self.pinata_api_key or not self.pinata_secret:
+                return False, '', 'Pinata API credentials not configured'
+            if metadata:
+                pinata_metadata = {'name': filename, 'keyvalues': metadata}
+                fields['pinataMetadata'] = (None, _dumps(pinata_metadata), 'application/json')
+            encoder = MultipartEncoder(fields=fields)
+            url = 'https://api.pinata.cloud/pinning/pinFileToIPFS'
+            headers = {
+                'pinata_api_key': self.pinata_api_key,
+                'pinata_secret_api_key': self.pinata_secret,
+                'Content-Type': encoder.content_type
+            }
+            auth = None
+            hash_key = 'IpfsHash'
+        elif self.provider == 'infura':
+            if not self.infura_project_id or not self.infura_project_secret:
+                return False, '', 'Infura IPFS credentials not configured'
+            encoder = MultipartEncoder(fields=fields)
+            url = 'https://ipfs.infura.io:5001/api/v0/add'
+            headers = {'Content-Type': encoder.content_type}
+            auth = (self.infura_project_id, self.infura_project_secret)
+            hash_key = 'Hash'
+        else:
+            encoder = MultipartEncoder(fields=fields)
+            url = f'{self.local_ipfs_url}/api/v0/add'
+            headers = {'Content-Type': encoder.content_type}
+            auth = None
+            hash_key = 'Hash'
+
+        try:
+            response = _session.post(url, data=encoder, headers=headers, auth=auth, timeout=60)
+            if response.status_code == 200:
+                result = _loads(response.content)
+                return True, result.get(hash_key, ''), ''
+            else:
+                return False, '', f'IPFS upload failed: {response.text}'
+        except requests.RequestException as e:
+            return False, '', f'IPFS upload error: {str(e)}'
+
     def download_file(self, ipfs_hash: str) -> Tuple[bool, bytes, str]:
         """
         Download file from IPFS.
@@ -126,17 +288,52 @@ class IPFSClient:
         Returns:
             Tuple of (success, file_data, error_message)
         """
+        cached = self._cache_get(ipfs_hash)
+        if cached is not None:
+            return True, cached, ''
+
         gateway_url = f'{self.ipfs_gateway}{ipfs_hash}'
 
         try:
-            response = requests.get(gateway_url, timeout=60)
+            response = _session.get(gateway_url, timeout=60)
             if response.status_code == 200:
+                self._cache_put(ipfs_hash, response.content)
                 return True, response.content, ''
             else:
                 return False, b'', f'IPFS download failed: {response.status_code}'
         except requests.RequestException as e:
             return False, b'', f'IPFS download error: {str(e)}'
 
+    def download_file_stream(self, ipfs_hash: str, chunk_size: int = 65536):
+        """
+        Download file from IPFS as a stream of chunks.
+
+        Args:
+            ipfs_hash: IPFS CID/hash
+            chunk_size: Size of each yielded chunk in bytes
+
+        Returns:
+            Tuple of (success, chunk_iterator_or_None, error_message)
+        """
+        cache_path = self._cache_path(ipfs_hash)
+        if cache_path and os.path.exists(cache_path):
+            def _read_cached():
+                with open(cache_path, 'rb') as f:
+                    while chunk := f.read(chunk_size):
+                        yield chunk
+            return True, _read_cached(), ''
+
+        gateway_url = f'{self.ipfs_gateway}{ipfs_hash}'
+
+        try:
+            response = _session.get(gateway_url, timeout=60, stream=True)
+            if response.status_code == 200:
+                return True, response.iter_content(chunk_size=chunk_size), ''
+            response.close()
+            return False, None, f'IPFS download failed: {response.status_code}'
+        except requests.RequestException as e:
+            return False, None, f'IPFS download error: {str(e)}'
+
     def pin_file(self, ipfs_hash: str) -> Tuple[bool, str]:
         """
         Pin a file to ensure it stays available.
@@ -154,7 +351,7 @@ class IPFSClient:
         payload = {'hashToPin': ipfs_hash}
 
         try:
-            response = requests.post(url, headers=headers, json=payload, timeout=30)
+            response = _session.post(url, headers=headers, json=payload, timeout=30)
             if response.status_code == 200:
                 return True, ''
             else:
@@ -177,7 +374,7 @@ class IPFSClient:
         }
 
         try:
-            response = requests.delete(url, headers=headers, timeout=30)
+            response = _session.delete(url, headers=headers, timeout=30)
             if response.status_code == 200:
                 return True, ''
             else:
@@ -199,12 +396,7 @@ class IPFSClient:
             return True  # Local IPFS assumed available
 
 
-# Singleton instance
-_ipfs_client = None
-
+@cache
 def get_ipfs_client() -> IPFSClient:
     """Get singleton IPFS client instance."""
-    global _ipfs_client
-    if _ipfs_client is None:
-        _ipfs_client = IPFSClient()
-    return _ipfs_client
+    return IPFSClient()
@@ -1,13 +1,51 @@
 import os
 import secrets
 
+_BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+_PROJECT_DIR = os.path.abspath(os.path.join(_BASE_DIR, '..'))
+
+
+def _load_or_generate_secret(name):
+    """Resolve a secret from the environment or a persisted key file.
+
+    Generating a fresh token as the env-var fallback meant every process
+    got a different key, so JWTs issued by one Gunicorn worker were
+    rejected by the next. When the env var is unset, the generated value
+    is persisted under PROJECT_DIR (mode 0600) and reused by all workers
+    and restarts.
+    """
+    value = os.environ.get(name)
+    if value:
+        return value
+    path = os.path.join(_PROJECT_DIR, f'.{name.lower()}')
+    try:
+        with open(path) as f:
+            value = f.read().strip()
+        if value:
+            return value
+    except OSError:
+        pass
+    value = secrets.token_hex(32)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            f.write(value)
+    except OSError:
+        print(f"Warning: could not persist generated {name}; "
+              "tokens will not survive a restart.")
+    return value
+
+
 class Config:
-    BASE_DIR = os.path.abspath(os.path.dirname(__file__))
-    PROJECT_DIR = os.path.abspath(os.path.join(BASE_DIR, '..'))
+    BASE_DIR = _BASE_DIR
+    PROJECT_DIR = _PROJECT_DIR
 
-    SECRET_KEY = os.environ.get('SECRET_KEY', secrets.token_hex(32))
-    JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', secrets.token_hex(32))
+    SECRET_KEY = _load_or_generate_secret('SECRET_KEY')
+    JWT_SECRET_KEY = _load_or_generate_secret('JWT_SECRET_KEY')
     JWT_ACCESS_TOKEN_EXPIRES = 3600 * 8  # 8 hours
+
+    # bcrypt work factor; tune to ~250 ms per hash on the target hardware
+    BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
     JWT_TOKEN_LOCATION = ['headers']
     JWT_HEADER_NAME = 'Authorization'
     JWT_HEADER_TYPE = 'Bearer'
@@ -17,6 +55,10 @@ class Config:
 
     UPLOAD_FOLDER = os.path.join(PROJECT_DIR, 'uploads')
     MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # 50 MB
+    # Zero-copy file downloads when fronted by a server that handles
+    # X-Sendfile/X-Accel-Redirect (nginx/Apache); leave off for the
+    # bare dev server, which must stream the bytes itself
+    USE_X_SENDFILE = os.environ.get('USE_X_SENDFILE', 'false').lower() == 'true'
     ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'gif', 'bmp', 'tiff', 'dcm', 'doc', 'docx'}
 
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', 'http://localhost:3000').split(',')
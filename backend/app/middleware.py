@@ -1,32 +1,106 @@
-from functools import wraps
+import atexit
+import base64
+import hashlib
+import hmac
+import json
+import queue
+import threading
+import time
+from functools import lru_cache, wraps
 from flask import request, jsonify, g
 import jwt
-import datetime
 from .config import Config
-from .database import query_db, dict_from_row, execute_db
+from .database import query_db, dict_from_row
+
+
+# Tokens are always HS256, so signing and verification go straight
+# through hmac/hashlib instead of PyJWT's per-call algorithm lookup and
+# claim machinery. The wire format is identical; set JWT_USE_PYJWT=True
+# in config to fall back to the library implementation.
+_JWT_HEADER = b'eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9'  # {"alg":"HS256","typ":"JWT"}
+_JWT_USE_PYJWT = getattr(Config, 'JWT_USE_PYJWT', False)
+_JWT_EXP_SECS = Config.JWT_ACCESS_TOKEN_EXPIRES
+
+
+def _b64url_encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=')
+
+
+def _b64url_decode(data):
+    return base64.urlsafe_b64decode(data + b'=' * (-len(data) % 4))
+
+
+def _secret_bytes():
+    key = Config.JWT_SECRET_KEY
+    return key.encode('utf-8') if isinstance(key, str) else key
+
+
+@lru_cache(maxsize=4096)
+def _decode_cached(token):
+    """Verify signature and parse the token once per distinct token.
+
+    Expiry is deliberately not checked here: the cached payload outlives
+    the token, so decode_token re-checks exp on every hit. The secret is
+    fixed for the process lifetime, so no invalidation hook is needed.
+    """
+    if _JWT_USE_PYJWT:
+        return jwt.decode(token, Config.JWT_SECRET_KEY, algorithms=['HS256'],
+                          options={'verify_exp': False})
+    try:
+        header_b64, payload_b64, sig_b64 = token.encode('ascii').split(b'.')
+        signing_input = header_b64 + b'.' + payload_b64
+        expected = hmac.new(_secret_bytes(), signing_input, hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64url_decode(sig_b64)):
+            raise jwt.InvalidTokenError('Signature verification failed')
+        header = json.loads(_b64url_decode(header_b64))
+        if header.get('alg') != 'HS256':
+            raise jwt.InvalidTokenError('Unexpected algorithm')
+        return json.loads(_b64url_decode(payload_b64))
+    except (ValueError, UnicodeError) as e:
+        raise jwt.InvalidTokenError(str(e))
 
 
 def decode_token(token):
     """Decode a JWT token."""
     try:
-        payload = jwt.decode(token, Config.JWT_SECRET_KEY, algorithms=['HS256'])
-        return payload
-    except jwt.ExpiredSignatureError:
-        return None
+        payload = _decode_cached(token)
     except jwt.InvalidTokenError:
         return None
+    if payload.get('exp', 0) <= time.time():
+        return None
+    return payload
 
 
 def create_token(user_id, username, role_name):
     """Create a JWT token."""
+    now = int(time.time())
     payload = {
         'user_id': user_id,
         'username': username,
         'role': role_name,
-        'exp': datetime.datetime.utcnow() + datetime.timedelta(seconds=Config.JWT_ACCESS_TOKEN_EXPIRES),
-        'iat': datetime.datetime.utcnow()
+        'exp': now + _JWT_EXP_SECS,
+        'iat': now
     }
-    return jwt.encode(payload, Config.JWT_SECRET_KEY, algorithm='HS256')
+    if _JWT_USE_PYJWT:
+        return jwt.encode(payload, Config.JWT_SECRET_KEY, algorithm='HS256')
+    payload_b64 = _b64url_encode(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+    signing_input = _JWT_HEADER + b'.' + payload_b64
+    sig = _b64url_encode(hmac.new(_secret_bytes(), signing_input, hashlib.sha256).digest())
+    return (signing_input + b'.' + sig).decode('ascii')
+
+
+# Single round trip for everything the request needs to know about the
+# caller: user row, role name, and linked patient/doctor IDs. sqlite3
+# keeps the compiled statement in the connection's statement cache, so
+# repeating the identical SQL string reuses the prepared plan.
+_AUTH_USER_QUERY = '''
+    SELECT u.*, r.name AS role_name, p.id AS patient_id, d.id AS doctor_id
+    FROM users u
+    JOIN roles r ON u.role_id = r.id
+    LEFT JOIN patients p ON p.user_id = u.id
+    LEFT JOIN doctors d ON d.user_id = u.id
+    WHERE u.id = ? AND u.is_active = 1
+'''
 
 
 def jwt_required(f):
@@ -45,8 +119,7 @@ def jwt_required(f):
         if not payload:
             return jsonify({'error': 'Invalid or expired token'}), 401
 
-        user = query_db('SELECT u.*, r.name as role_name FROM users u JOIN roles r ON u.role_id=r.id WHERE u.id=? AND u.is_active=1',
-                        [payload['user_id']], one=True)
+        user = query_db(_AUTH_USER_QUERY, [payload['user_id']], one=True)
         if not user:
             return jsonify({'error': 'User not found or inactive'}), 401
 
@@ -70,27 +143,149 @@ def role_required(*roles):
     return decorator
 
 
+# Short-TTL cache for slow-changing lookups: staff fan-out lists, role
+# ids, user->profile links. 60 s of staleness is acceptable for all of
+# these, and admin endpoints that mutate users/roles call
+# invalidate_lookup_cache so changes show up immediately in-process.
+_LOOKUP_TTL = 60.0
+_lookup_cache = {}
+_lookup_lock = threading.Lock()
+
+
+def _cached_lookup(key, loader):
+    now = time.monotonic()
+    with _lookup_lock:
+        entry = _lookup_cache.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+    value = loader()
+    with _lookup_lock:
+        _lookup_cache[key] = (now + _LOOKUP_TTL, value)
+    return value
+
+
+def invalidate_lookup_cache():
+    """Drop all cached lookups (after user/role mutations)."""
+    with _lookup_lock:
+        _lookup_cache.clear()
+
+
+def staff_user_ids():
+    """IDs of active Staff users, for notification fan-outs."""
+    return _cached_lookup('staff_user_ids', lambda: [
+        r['id'] for r in query_db(
+            "SELECT u.id FROM users u JOIN roles r ON u.role_id=r.id "
+            "WHERE r.name='Staff' AND u.is_active=1")
+    ])
+
+
+def get_role_id(role_name):
+    """Get a role's id by name (roles are effectively static)."""
+    def load():
+        role = query_db('SELECT id FROM roles WHERE name=?', [role_name], one=True)
+        return role['id'] if role else None
+    return _cached_lookup(('role_id', role_name), load)
+
+
 def get_patient_id_for_user(user_id):
     """Get the patient_id for a user (if they are a patient)."""
-    patient = query_db('SELECT id FROM patients WHERE user_id=?', [user_id], one=True)
-    return patient['id'] if patient else None
+    current = getattr(g, 'current_user', None)
+    if current and current.get('id') == user_id:
+        return current.get('patient_id')
+
+    def load():
+        patient = query_db('SELECT id FROM patients WHERE user_id=?', [user_id], one=True)
+        return patient['id'] if patient else None
+    return _cached_lookup(('patient_id', user_id), load)
 
 
 def get_doctor_id_for_user(user_id):
     """Get the doctor_id for a user (if they are a doctor)."""
-    doctor = query_db('SELECT id FROM doctors WHERE user_id=?', [user_id], one=True)
-    return doctor['id'] if doctor else None
+    current = getattr(g, 'current_user', None)
+    if current and current.get('id') == user_id:
+        return current.get('doctor_id')
+
+    def load():
+        doctor = query_db('SELECT id FROM doctors WHERE user_id=?', [user_id], one=True)
+        return doctor['id'] if doctor else None
+    return _cached_lookup(('doctor_id', user_id), load)
+
+
+# Audit writes are fire-and-forget: a background thread drains the queue
+# in batches, so the request thread never pays the WAL-commit fsync for
+# logging. Mirrors the write-behind persist worker in blockchain_service.
+_AUDIT_SQL = '''INSERT INTO audit_logs (user_id, username, action, resource_type, resource_id, details, ip_address, user_agent)
+                VALUES (?,?,?,?,?,?,?,?)'''
+_AUDIT_FLUSH_INTERVAL = 0.05   # seconds to wait for more rows before committing
+_AUDIT_FLUSH_BATCH = 100       # max rows per commit
+
+_audit_queue = queue.Queue()
+_audit_thread = None
+_audit_thread_lock = threading.Lock()
+
+
+def _audit_worker():
+    """Drain the audit queue in batches, one commit per batch."""
+    from .database import get_db
+    while True:
+        rows = [_audit_queue.get()]
+        deadline = time.monotonic() + _AUDIT_FLUSH_INTERVAL
+        while len(rows) < _AUDIT_FLUSH_BATCH:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                rows.append(_audit_queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        try:
+            # Thread-local connection; stays open for the worker's lifetime
+            db = get_db()
+            db.executemany(_AUDIT_SQL, rows)
+            db.commit()
+        except Exception as e:
+            print(f"Warning: Failed to write audit logs: {e}")
+        finally:
+            for _ in rows:
+                _audit_queue.task_done()
+
+
+def _ensure_audit_worker():
+    """Start the background audit thread on first use."""
+    global _audit_thread
+    if _audit_thread is None or not _audit_thread.is_alive():
+        with _audit_thread_lock:
+            if _audit_thread is None or not _audit_thread.is_alive():
+                _audit_thread = threading.Thread(
+                    target=_audit_worker, name='audit-log', daemon=True
+                )
+                _audit_thread.start()
+
+
+def flush_audit_queue():
+    """Block until all queued audit rows are committed."""
+    if _audit_thread is not None and _audit_thread.is_alive():
+        _audit_queue.join()
+
+
+atexit.register(flush_audit_queue)
+
 
+def log_audit(action, resource_type=None, resource_id=None, details=None,
+              user_id=None, username=None):
+    """Log an audit event (queued; written by a background batcher).
 
-def log_audit(action, resource_type=None, resource_id=None, details=None):
-    """Log an audit event."""
-    user_id = g.current_user['id'] if hasattr(g, 'current_user') and g.current_user else None
-    username = g.current_user['username'] if hasattr(g, 'current_user') and g.current_user else 'system'
+    Pre-auth handlers like login can pass user_id/username directly
+    instead of materializing g.current_user just for audit plumbing.
+    """
+    if user_id is None:
+        user_id = g.current_user['id'] if hasattr(g, 'current_user') and g.current_user else None
+    if username is None:
+        username = g.current_user['username'] if hasattr(g, 'current_user') and g.current_user else 'system'
     ip_address = request.remote_addr
     user_agent = request.headers.get('User-Agent', '')[:255]
 
-    execute_db(
-        '''INSERT INTO audit_logs (user_id, username, action, resource_type, resource_id, details, ip_address, user_agent)
-           VALUES (?,?,?,?,?,?,?,?)''',
+    _ensure_audit_worker()
+    _audit_queue.put_nowait(
         [user_id, username, action, resource_type, resource_id, details, ip_address, user_agent]
     )
@@ -1,11 +1,16 @@
 from flask import Blueprint, request, jsonify, g
-from ..database import query_db, execute_db, dicts_from_rows, dict_from_row
-from ..middleware import jwt_required, role_required, get_patient_id_for_user, get_doctor_id_for_user, log_audit
-from ..utils import validate_required, parse_pagination
+from ..database import query_db, execute_db, execute_many, dict_from_row, transactional
+from ..middleware import jwt_required, role_required, get_patient_id_for_user, get_doctor_id_for_user, log_audit, staff_user_ids
+from ..utils import validate_required, parse_pagination, paged_list
 from ..blockchain import get_blockchain_service
 
 appointments_bp = Blueprint('appointments', __name__, url_prefix='/api/appointments')
 
+# Tuple (not set) so the generated UPDATE lists columns in a stable
+# order and identical request shapes reuse the same cached statement.
+_APPT_UPDATE_FIELDS = ('doctor_id', 'department_id', 'appointment_date', 'appointment_time',
+                       'visit_type', 'status', 'reason', 'notes')
+
 
 @appointments_bp.route('', methods=['GET'])
 @jwt_required
@@ -14,10 +19,7 @@ def list_appointments():
     page, per_page = parse_pagination(request)
     patient_id = request.args.get('patient_id', type=int)
 
-    query = '''SELECT a.*, p.mrn, p.first_name || ' ' || p.last_name as patient_name,
-                      d.first_name || ' ' || d.last_name as doctor_name,
-                      dep.name as department_name
-               FROM appointments a
+    base = '''FROM appointments a
                JOIN patients p ON a.patient_id=p.id
                LEFT JOIN doctors d ON a.doctor_id=d.id
                LEFT JOIN departments dep ON a.department_id=dep.id
@@ -26,30 +28,26 @@ def list_appointments():
 
     if role == 'Patient':
         pid = get_patient_id_for_user(g.current_user['id'])
-        query += ' AND a.patient_id=?'
+        base += ' AND a.patient_id=?'
         args.append(pid)
     elif role == 'Doctor':
         doc_id = get_doctor_id_for_user(g.current_user['id'])
-        query += ' AND a.doctor_id=?'
+        base += ' AND a.doctor_id=?'
         args.append(doc_id)
     elif patient_id:
-        query += ' AND a.patient_id=?'
+        base += ' AND a.patient_id=?'
         args.append(patient_id)
 
     status = request.args.get('status')
     if status:
-        query += ' AND a.status=?'
+        base += ' AND a.status=?'
         args.append(status)
 
-    count_q = query.replace(
-        "SELECT a.*, p.mrn, p.first_name || ' ' || p.last_name as patient_name,\n                      d.first_name || ' ' || d.last_name as doctor_name,\n                      dep.name as department_name",
-        'SELECT COUNT(*) as cnt')
-    total = query_db(count_q, args, one=True)['cnt']
-
-    query += ' ORDER BY a.appointment_date DESC, a.appointment_time DESC LIMIT ? OFFSET ?'
-    args.extend([per_page, (page - 1) * per_page])
-
-    appointments = dicts_from_rows(query_db(query, args))
+    appointments, total = paged_list(
+        '''SELECT a.*, p.mrn, p.first_name || ' ' || p.last_name as patient_name,
+                  d.first_name || ' ' || d.last_name as doctor_name,
+                  dep.name as department_name''',
+        base, args, 'ORDER BY a.appointment_date DESC, a.appointment_time DESC', page, per_page)
     return jsonify({'appointments': appointments, 'total': total, 'page': page, 'per_page': per_page}), 200
 
 
@@ -75,7 +73,7 @@ def get_appointment(appt_id):
         if appt['patient_id'] != pid:
             return jsonify({'error': 'Access denied'}), 403
 
-    return jsonify({'appointment': dict_from_row(appt)}), 200
+    return jsonify({'appointment': appt}), 200
 
 
 @appointments_bp.route('', methods=['POST'])
@@ -99,6 +97,33 @@ def create_appointment():
     if role in ('Staff', 'Admin'):
         status = data.get('status', 'Confirmed')
 
+    appt_id = _create_appointment_txn(data, role, status)
+
+    log_audit('CREATE_APPOINTMENT', 'appointment', appt_id)
+
+    # Store appointment hash on blockchain. Runs after the commit: in
+    # real mode this shells out to the peer CLI (30 s timeout), and
+    # holding the write lock across it would stall every other writer
+    # past busy_timeout.
+    try:
+        blockchain_service = get_blockchain_service()
+        appt_record = query_db('SELECT * FROM appointments WHERE id=?', [appt_id], one=True)
+        if appt_record:
+            blockchain_service.store_appointment(
+                appt_id,
+                data['patient_id'],
+                dict_from_row(appt_record),
+                metadata={'createdBy': g.current_user['id']}
+            )
+    except Exception as e:
+        print(f"Blockchain store error: {e}")
+
+    return jsonify({'message': 'Appointment created', 'id': appt_id}), 201
+
+
+@transactional
+def _create_appointment_txn(data, role, status):
+    """Insert the appointment and its notifications in one transaction."""
     appt_id = execute_db(
         '''INSERT INTO appointments (patient_id, doctor_id, department_id, appointment_date,
            appointment_time, visit_type, status, reason, notes, created_by)
@@ -111,15 +136,16 @@ def create_appointment():
 
     # Notify relevant people
     if role == 'Patient':
-        # Notify staff
-        staff_users = query_db("SELECT u.id FROM users u JOIN roles r ON u.role_id=r.id WHERE r.name='Staff' AND u.is_active=1")
-        for su in staff_users:
-            execute_db(
+        # Notify staff: one executemany + commit for the whole fan-out
+        # instead of an insert-and-commit per staff user
+        staff_ids = staff_user_ids()
+        if staff_ids:
+            message = f'A patient has requested an appointment on {data["appointment_date"]}.'
+            execute_many(
                 '''INSERT INTO notifications (user_id, title, message, notification_type, reference_type, reference_id)
                    VALUES (?,?,?,?,?,?)''',
-                [su['id'], 'New Appointment Request',
-                 f'A patient has requested an appointment on {data["appointment_date"]}.',
-                 'Appointment', 'appointment', appt_id]
+                [[staff_id, 'New Appointment Request', message,
+                  'Appointment', 'appointment', appt_id] for staff_id in staff_ids]
             )
     else:
         # Notify patient
@@ -133,23 +159,7 @@ def create_appointment():
                  'Appointment', 'appointment', appt_id]
             )
 
-    log_audit('CREATE_APPOINTMENT', 'appointment', appt_id)
-
-    # Store appointment hash on blockchain
-    try:
-        blockchain_service = get_blockchain_service()
-        appt_record = query_db('SELECT * FROM appointments WHERE id=?', [appt_id], one=True)
-        if appt_record:
-            blockchain_service.store_appointment(
-                appt_id,
-                data['patient_id'],
-                dict_from_row(appt_record),
-                metadata={'createdBy': g.current_user['id']}
-            )
-    except Exception as e:
-        print(f"Blockchain store error: {e}")
-
-    return jsonify({'message': 'Appointment created', 'id': appt_id}), 201
+    return appt_id
 
 
 @appointments_bp.route('/<int:appt_id>', methods=['PUT'])
@@ -157,19 +167,13 @@ def create_appointment():
 @role_required('Admin', 'Staff', 'Doctor')
 def update_appointment(appt_id):
     data = request.get_json()
-    appt = query_db('SELECT * FROM appointments WHERE id=?', [appt_id], one=True)
+    appt = query_db('SELECT patient_id FROM appointments WHERE id=?', [appt_id], one=True)
     if not appt:
         return jsonify({'error': 'Appointment not found'}), 404
 
-    fields = ['doctor_id', 'department_id', 'appointment_date', 'appointment_time',
-              'visit_type', 'status', 'reason', 'notes']
-    updates = []
-    args = []
-
-    for f in fields:
-        if f in data:
-            updates.append(f'{f}=?')
-            args.append(data[f])
+    present = [f for f in _APPT_UPDATE_FIELDS if f in data]
+    updates = [f'{f}=?' for f in present]
+    args = [data[f] for f in present]
 
     if data.get('status') in ('Confirmed', 'Rescheduled'):
         updates.append('approved_by=?')
@@ -180,23 +184,12 @@ def update_appointment(appt_id):
 
     updates.append('updated_at=CURRENT_TIMESTAMP')
     args.append(appt_id)
-    execute_db(f"UPDATE appointments SET {', '.join(updates)} WHERE id=?", args)
-
-    # Notify patient of changes
-    patient = query_db('SELECT user_id FROM patients WHERE id=?', [appt['patient_id']], one=True)
-    if patient and patient['user_id']:
-        status_text = data.get('status', 'updated')
-        execute_db(
-            '''INSERT INTO notifications (user_id, title, message, notification_type, reference_type, reference_id)
-               VALUES (?,?,?,?,?,?)''',
-            [patient['user_id'], f'Appointment {status_text}',
-             f'Your appointment has been {status_text.lower()}.',
-             'Appointment', 'appointment', appt_id]
-        )
+    _update_appointment_txn(appt_id, updates, args, appt['patient_id'], data)
 
     log_audit('UPDATE_APPOINTMENT', 'appointment', appt_id, f"Status: {data.get('status', 'updated')}")
 
-    # Update blockchain hash
+    # Update blockchain hash, outside the transaction for the same
+    # lock-hold reason as in create_appointment
     try:
         blockchain_service = get_blockchain_service()
         updated_appt = query_db('SELECT * FROM appointments WHERE id=?', [appt_id], one=True)
@@ -211,3 +204,21 @@ def update_appointment(appt_id):
         print(f"Blockchain update error: {e}")
 
     return jsonify({'message': 'Appointment updated'}), 200
+
+
+@transactional
+def _update_appointment_txn(appt_id, updates, args, patient_id, data):
+    """Apply the appointment update and its notification in one transaction."""
+    execute_db(f"UPDATE appointments SET {', '.join(updates)} WHERE id=?", args)
+
+    # Notify patient of changes
+    patient = query_db('SELECT user_id FROM patients WHERE id=?', [patient_id], one=True)
+    if patient and patient['user_id']:
+        status_text = data.get('status', 'updated')
+        execute_db(
+            '''INSERT INTO notifications (user_id, title, message, notification_type, reference_type, reference_id)
+               VALUES (?,?,?,?,?,?)''',
+            [patient['user_id'], f'Appointment {status_text}',
+             f'Your appointment has been {status_text.lower()}.',
+             'Appointment', 'appointment', appt_id]
+        )
@@ -1,10 +1,23 @@
 from flask import Blueprint, request, jsonify, g
-from ..database import query_db, dicts_from_rows
+from ..database import query_db
 from ..middleware import jwt_required, role_required
-from ..utils import parse_pagination
+from ..utils import parse_pagination, paged_list
 
 audit_bp = Blueprint('audit', __name__, url_prefix='/api/audit-logs')
 
+# Every action name log_audit is called with. The admin UI usually
+# filters on one of these exactly, which an index can serve; the
+# substring LIKE below is kept only as a fallback for free text.
+_KNOWN_ACTIONS = frozenset([
+    'ADD_INVOICE_ITEMS', 'CREATE_ALLERGY', 'CREATE_APPOINTMENT', 'CREATE_INVOICE',
+    'CREATE_NOTE', 'CREATE_PATIENT', 'CREATE_PRESCRIPTION', 'CREATE_REPORT',
+    'CREATE_USER', 'CREATE_VISIT', 'DEACTIVATE_USER', 'DELETE_INVOICE_FILE',
+    'DOWNLOAD_FILE', 'DOWNLOAD_INVOICE_FILE', 'LOGIN', 'PASSWORD_CHANGE',
+    'RECORD_VITALS', 'UPDATE_APPOINTMENT', 'UPDATE_PATIENT', 'UPDATE_PAYMENT',
+    'UPDATE_USER', 'UPDATE_VISIT', 'UPLOAD_INVOICE_FILE', 'VERIFY_REPORT',
+    'VIEW_INVOICE', 'VIEW_PATIENT', 'VIEW_PRESCRIPTION', 'VIEW_REPORT', 'VIEW_VISIT',
+])
+
 
 @audit_bp.route('', methods=['GET'])
 @jwt_required
@@ -12,39 +25,39 @@ audit_bp = Blueprint('audit', __name__, url_prefix='/api/audit-logs')
 def list_audit_logs():
     page, per_page = parse_pagination(request)
 
-    query = 'SELECT * FROM audit_logs WHERE 1=1'
+    base = 'FROM audit_logs WHERE 1=1'
     args = []
 
     user_id = request.args.get('user_id', type=int)
     if user_id:
-        query += ' AND user_id=?'
+        base += ' AND user_id=?'
         args.append(user_id)
 
     action = request.args.get('action')
     if action:
-        query += ' AND action LIKE ?'
-        args.append(f'%{action}%')
+        if action.upper() in _KNOWN_ACTIONS:
+            base += ' AND action=?'
+            args.append(action.upper())
+        else:
+            # Leading-wildcard LIKE can't use an index; full scan
+            base += ' AND action LIKE ?'
+            args.append(f'%{action}%')
 
     resource_type = request.args.get('resource_type')
     if resource_type:
-        query += ' AND resource_type=?'
+        base += ' AND resource_type=?'
         args.append(resource_type)
 
     date_from = request.args.get('date_from')
     if date_from:
-        query += ' AND created_at >= ?'
+        base += ' AND created_at >= ?'
         args.append(date_from)
 
     date_to = request.args.get('date_to')
     if date_to:
-        query += ' AND created_at <= ?'
+        base += ' AND created_at <= ?'
         args.append(date_to + ' 23:59:59')
 
-    count_q = query.replace('SELECT *', 'SELECT COUNT(*) as cnt')
-    total = query_db(count_q, args, one=True)['cnt']
-
-    query += ' ORDER BY created_at DESC LIMIT ? OFFSET ?'
-    args.extend([per_page, (page - 1) * per_page])
-
-    logs = dicts_from_rows(query_db(query, args))
+    logs, total = paged_list('SELECT *', base, args,
+                             'ORDER BY created_at DESC', page, per_page)
     return jsonify({'audit_logs': logs, 'total': total, 'page': page, 'per_page': per_page}), 200
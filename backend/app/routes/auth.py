@@ -1,28 +1,176 @@
 from flask import Blueprint, request, jsonify, g
+import atexit
 import bcrypt
+import os
 import secrets
 import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from ..database import query_db, execute_db, dict_from_row
+from ..database import query_db, execute_db, execute_many
 from ..middleware import create_token, jwt_required, log_audit
 from ..config import Config
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
+# User + role + (optional) patient/doctor profile in one round trip;
+# _build_profile used to fetch the patient or doctor row in a second
+# query on every login and /me call. Both joins are point lookups on
+# the indexed patients.user_id / doctors.user_id columns.
+_PROFILE_SELECT = '''SELECT u.id, u.username, u.password_hash, u.email, u.phone, u.is_active,
+           u.must_change_password, u.last_login, r.name as role_name,
+           p.id as patient_id, p.mrn,
+           p.first_name as patient_first_name, p.last_name as patient_last_name,
+           d.id as doctor_id, d.specialization,
+           d.first_name as doctor_first_name, d.last_name as doctor_last_name,
+           dep.name as department_name
+    FROM users u
+    JOIN roles r ON u.role_id=r.id
+    LEFT JOIN patients p ON p.user_id=u.id
+    LEFT JOIN doctors d ON d.user_id=u.id
+    LEFT JOIN departments dep ON d.department_id=dep.id'''
+
+
+# Emails are sent off the request thread; SMTP connect + STARTTLS +
+# login can take seconds and must not hold a Flask worker. The
+# authenticated connection is kept open between sends so the TLS
+# handshake is paid once, not per email.
+_email_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='auth-email')
+_smtp_lock = threading.Lock()
+_smtp_conn = None
+
+
+def _smtp_connection():
+    """Return the shared authenticated SMTP connection (caller holds the lock)."""
+    global _smtp_conn
+    if _smtp_conn is None:
+        conn = smtplib.SMTP(Config.SMTP_SERVER, Config.SMTP_PORT)
+        conn.starttls()
+        conn.login(Config.SMTP_EMAIL, Config.SMTP_PASSWORD)
+        _smtp_conn = conn
+    return _smtp_conn
+
 
 def _send_email(to_email, subject, html_body):
     """Send an email using SMTP."""
+    global _smtp_conn
     msg = MIMEMultipart('alternative')
     msg['Subject'] = subject
     msg['From'] = Config.SMTP_EMAIL
     msg['To'] = to_email
     msg.attach(MIMEText(html_body, 'html'))
 
-    with smtplib.SMTP(Config.SMTP_SERVER, Config.SMTP_PORT) as server:
-        server.starttls()
-        server.login(Config.SMTP_EMAIL, Config.SMTP_PASSWORD)
-        server.sendmail(Config.SMTP_EMAIL, to_email, msg.as_string())
+    with _smtp_lock:
+        try:
+            _smtp_connection().sendmail(Config.SMTP_EMAIL, to_email, msg.as_string())
+        except (smtplib.SMTPException, OSError):
+            # Stale connection (server idle timeout); reconnect and retry once
+            _smtp_conn = None
+            _smtp_connection().sendmail(Config.SMTP_EMAIL, to_email, msg.as_string())
+
+
+def _send_email_async(to_email, subject, html_body):
+    """Queue an email on the background pool; failures are logged, not raised."""
+    def send():
+        try:
+            _send_email(to_email, subject, html_body)
+        except Exception as e:
+            print(f"Warning: failed to send email to {to_email}: {e}")
+    _email_pool.submit(send)
+
+
+# bcrypt's C core releases the GIL, so running it on a pool lets other
+# requests proceed during the ~250 ms hash instead of serializing every
+# login behind it. BCRYPT_ROUNDS lets ops tune the work factor to the
+# hardware without weakening the default.
+_bcrypt_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 4,
+                                  thread_name_prefix='bcrypt')
+_BCRYPT_ROUNDS = getattr(Config, 'BCRYPT_ROUNDS', 12)
+
+
+def _hash_password(password):
+    """Hash a password with the configured work factor, off the request thread."""
+    return _bcrypt_pool.submit(
+        bcrypt.hashpw, password.encode('utf-8'), bcrypt.gensalt(_BCRYPT_ROUNDS)
+    ).result().decode('utf-8')
+
+
+def _check_password(password, password_hash):
+    """Check a password against a stored hash, off the request thread."""
+    return _bcrypt_pool.submit(
+        bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8')
+    ).result()
+
+
+@lru_cache(maxsize=1)
+def _dummy_hash():
+    """A throwaway hash at the real work factor, for unknown-user logins."""
+    return bcrypt.hashpw(b'*', bcrypt.gensalt(_BCRYPT_ROUNDS)).decode('utf-8')
+
+
+# last_login is a soft tracking value, so it doesn't warrant a write
+# transaction on the login hot path. Successful logins record the stamp
+# here and a daemon thread flushes the buffer as one batched UPDATE
+# every few seconds (and at exit).
+_LAST_LOGIN_FLUSH_INTERVAL = 5.0
+_last_login_buf = {}
+_last_login_lock = threading.Lock()
+_last_login_thread = None
+
+
+def _touch_last_login(user_id):
+    global _last_login_thread
+    with _last_login_lock:
+        _last_login_buf[user_id] = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+        if _last_login_thread is None:
+            _last_login_thread = threading.Thread(
+                target=_last_login_worker, name='last-login-flush', daemon=True)
+            _last_login_thread.start()
+
+
+def _last_login_worker():
+    while True:
+        time.sleep(_LAST_LOGIN_FLUSH_INTERVAL)
+        flush_last_login_buffer()
+
+
+def flush_last_login_buffer():
+    """Write any buffered last_login stamps in one batch."""
+    with _last_login_lock:
+        if not _last_login_buf:
+            return
+        pending = dict(_last_login_buf)
+        _last_login_buf.clear()
+    try:
+        execute_many('UPDATE users SET last_login=? WHERE id=?',
+                     [[stamp, user_id] for user_id, stamp in pending.items()])
+    except Exception as e:
+        print(f"Warning: failed to flush last_login buffer: {e}")
+
+
+atexit.register(flush_last_login_buffer)
+
+
+# Built once at import; forgot_password only fills in the two
+# per-request values instead of rebuilding the whole HTML body.
+_RESET_EMAIL_TMPL = """
+    <div style="font-family: Arial, sans-serif; max-width: 500px; margin: 0 auto; padding: 20px;">
+        <div style="text-align: center; margin-bottom: 20px;">
+            <h2 style="color: #2563eb;">🏥 Hospital Management System</h2>
+        </div>
+        <p>Hello <strong>{username}</strong>,</p>
+        <p>You requested a password reset. Click the button below to set a new password:</p>
+        <div style="text-align: center; margin: 30px 0;">
+            <a href="{reset_link}" style="background: #2563eb; color: white; padding: 12px 30px; text-decoration: none; border-radius: 6px; font-weight: bold;">Reset Password</a>
+        </div>
+        <p style="font-size: 13px; color: #666;">This link expires in 1 hour. If you didn't request this, ignore this email.</p>
+        <hr style="border: none; border-top: 1px solid #eee; margin: 20px 0;" />
+        <p style="font-size: 11px; color: #999; text-align: center;">Hospital Management System</p>
+    </div>
+    """
 
 
 @auth_bp.route('/login', methods=['POST'])
@@ -33,29 +181,37 @@ def login():
 
     identifier = data['identifier'].strip()
 
-    # Try to find user by username, email, or phone
+    # Resolve the identifier with three UNION ALL point lookups (each
+    # branch uses its own index; the OR form forced a full scan of
+    # users), then hang the profile joins off the single matched id.
     user = query_db(
-        'SELECT u.*, r.name as role_name FROM users u JOIN roles r ON u.role_id=r.id WHERE u.username=? OR u.email=? OR u.phone=?',
+        _PROFILE_SELECT + '''
+           WHERE u.id = (SELECT id FROM users WHERE username=?
+                         UNION ALL SELECT id FROM users WHERE email=?
+                         UNION ALL SELECT id FROM users WHERE phone=?
+                         LIMIT 1)''',
         [identifier, identifier, identifier], one=True
     )
 
     if not user:
+        # Burn the same bcrypt cost as a real check so response timing
+        # doesn't reveal whether the account exists
+        _check_password(data['password'], _dummy_hash())
         return jsonify({'error': 'Invalid credentials'}), 401
 
     if not user['is_active']:
         return jsonify({'error': 'Account is deactivated. Contact hospital administration.'}), 403
 
-    if not bcrypt.checkpw(data['password'].encode('utf-8'), user['password_hash'].encode('utf-8')):
+    if not _check_password(data['password'], user['password_hash']):
         return jsonify({'error': 'Invalid credentials'}), 401
 
     token = create_token(user['id'], user['username'], user['role_name'])
 
-    execute_db('UPDATE users SET last_login=CURRENT_TIMESTAMP WHERE id=?', [user['id']])
+    _touch_last_login(user['id'])
 
     # Audit
-    g.current_user = dict_from_row(user)
-    g.current_user['role'] = user['role_name']
-    log_audit('LOGIN', 'user', user['id'], f"User {user['username']} logged in")
+    log_audit('LOGIN', 'user', user['id'], f"User {user['username']} logged in",
+              user_id=user['id'], username=user['username'])
 
     # Get profile info
     profile = _build_profile(user)
@@ -79,10 +235,10 @@ def signup():
         return jsonify({'error': 'Admin password is required to create accounts'}), 400
 
     admin_user = query_db(
-        'SELECT u.*, r.name as role_name FROM users u JOIN roles r ON u.role_id=r.id WHERE r.name=? AND u.is_active=1',
+        'SELECT u.id, u.password_hash FROM users u JOIN roles r ON u.role_id=r.id WHERE r.name=? AND u.is_active=1',
         ['Admin'], one=True
     )
-    if not admin_user or not bcrypt.checkpw(admin_password.encode('utf-8'), admin_user['password_hash'].encode('utf-8')):
+    if not admin_user or not _check_password(admin_password, admin_user['password_hash']):
         return jsonify({'error': 'Invalid admin password'}), 403
 
     # Validate required fields
@@ -98,16 +254,18 @@ def signup():
     if len(data['password']) < 6:
         return jsonify({'error': 'Password must be at least 6 characters'}), 400
 
-    # Check uniqueness
-    existing = query_db('SELECT id FROM users WHERE username=?', [username], one=True)
-    if existing:
+    # Check uniqueness (both probes in one round trip)
+    existing = query_db(
+        'SELECT (SELECT id FROM users WHERE username=?) AS by_username, '
+        '(SELECT id FROM users WHERE email=?) AS by_email',
+        [username, email], one=True
+    )
+    if existing['by_username']:
         return jsonify({'error': 'Username already taken'}), 409
-
-    existing_email = query_db('SELECT id FROM users WHERE email=?', [email], one=True)
-    if existing_email:
+    if existing['by_email']:
         return jsonify({'error': 'Email already registered'}), 409
 
-    password_hash = bcrypt.hashpw(data['password'].encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    password_hash = _hash_password(data['password'])
 
     user_id = execute_db(
         'INSERT INTO users (username, password_hash, email, phone, role_id, first_name, last_name, must_change_password) VALUES (?,?,?,?,?,?,?,0)',
@@ -139,41 +297,27 @@ def forgot_password():
         return jsonify({'error': 'Email is required'}), 400
 
     email = data['email'].strip()
-    user = query_db('SELECT * FROM users WHERE email=? AND is_active=1', [email], one=True)
+    user = query_db('SELECT id, username FROM users WHERE email=? AND is_active=1', [email], one=True)
 
     # Always return success to prevent email enumeration
     if not user:
         return jsonify({'message': 'If the email exists, a reset link has been sent'}), 200
 
-    # Generate reset token
+    # Generate reset token; the expiry is computed here rather than with
+    # datetime("now", "+1 hour") so SQLite just binds a value instead of
+    # evaluating a function inside the write.
     reset_token = secrets.token_urlsafe(32)
+    expiry = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(time.time() + 3600))
     execute_db(
-        'UPDATE users SET reset_token=?, reset_token_expiry=datetime("now", "+1 hour") WHERE id=?',
-        [reset_token, user['id']]
+        'UPDATE users SET reset_token=?, reset_token_expiry=? WHERE id=?',
+        [reset_token, expiry, user['id']]
     )
 
     # Send reset email
     reset_link = f"http://localhost:3000/reset-password?token={reset_token}"
-    html_body = f"""
-    <div style="font-family: Arial, sans-serif; max-width: 500px; margin: 0 auto; padding: 20px;">
-        <div style="text-align: center; margin-bottom: 20px;">
-            <h2 style="color: #2563eb;">🏥 Hospital Management System</h2>
-        </div>
-        <p>Hello <strong>{user['username']}</strong>,</p>
-        <p>You requested a password reset. Click the button below to set a new password:</p>
-        <div style="text-align: center; margin: 30px 0;">
-            <a href="{reset_link}" style="background: #2563eb; color: white; padding: 12px 30px; text-decoration: none; border-radius: 6px; font-weight: bold;">Reset Password</a>
-        </div>
-        <p style="font-size: 13px; color: #666;">This link expires in 1 hour. If you didn't request this, ignore this email.</p>
-        <hr style="border: none; border-top: 1px solid #eee; margin: 20px 0;" />
-        <p style="font-size: 11px; color: #999; text-align: center;">Hospital Management System</p>
-    </div>
-    """
+    html_body = _RESET_EMAIL_TMPL.format(username=user['username'], reset_link=reset_link)
 
-    try:
-        _send_email(email, 'Password Reset - Hospital Management System', html_body)
-    except Exception as e:
-        return jsonify({'error': 'Failed to send email. Please try again later.'}), 500
+    _send_email_async(email, 'Password Reset - Hospital Management System', html_body)
 
     return jsonify({'message': 'If the email exists, a reset link has been sent'}), 200
 
@@ -188,15 +332,16 @@ def reset_password():
     if len(data['new_password']) < 6:
         return jsonify({'error': 'Password must be at least 6 characters'}), 400
 
+    now = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
     user = query_db(
-        'SELECT * FROM users WHERE reset_token=? AND reset_token_expiry > datetime("now") AND is_active=1',
-        [data['token']], one=True
+        'SELECT id FROM users WHERE reset_token=? AND reset_token_expiry > ? AND is_active=1',
+        [data['token'], now], one=True
     )
 
     if not user:
         return jsonify({'error': 'Invalid or expired reset link'}), 400
 
-    new_hash = bcrypt.hashpw(data['new_password'].encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    new_hash = _hash_password(data['new_password'])
     execute_db(
         'UPDATE users SET password_hash=?, reset_token=NULL, reset_token_expiry=NULL, must_change_password=0, updated_at=CURRENT_TIMESTAMP WHERE id=?',
         [new_hash, user['id']]
@@ -215,10 +360,7 @@ def get_roles():
 @auth_bp.route('/me', methods=['GET'])
 @jwt_required
 def me():
-    user = query_db(
-        'SELECT u.*, r.name as role_name FROM users u JOIN roles r ON u.role_id=r.id WHERE u.id=?',
-        [g.current_user['id']], one=True
-    )
+    user = query_db(_PROFILE_SELECT + ' WHERE u.id=?', [g.current_user['id']], one=True)
     if not user:
         return jsonify({'error': 'User not found'}), 404
     return jsonify({'user': _build_profile(user)}), 200
@@ -234,11 +376,11 @@ def change_password():
     if len(data['new_password']) < 6:
         return jsonify({'error': 'New password must be at least 6 characters'}), 400
 
-    user = query_db('SELECT * FROM users WHERE id=?', [g.current_user['id']], one=True)
-    if not bcrypt.checkpw(data['current_password'].encode('utf-8'), user['password_hash'].encode('utf-8')):
+    user = query_db('SELECT password_hash FROM users WHERE id=?', [g.current_user['id']], one=True)
+    if not _check_password(data['current_password'], user['password_hash']):
         return jsonify({'error': 'Current password is incorrect'}), 401
 
-    new_hash = bcrypt.hashpw(data['new_password'].encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    new_hash = _hash_password(data['new_password'])
     execute_db('UPDATE users SET password_hash=?, must_change_password=0, updated_at=CURRENT_TIMESTAMP WHERE id=?',
                [new_hash, g.current_user['id']])
 
@@ -247,7 +389,7 @@ def change_password():
 
 
 def _build_profile(user):
-    """Build the user profile dict."""
+    """Build the user profile dict from a _PROFILE_SELECT row."""
     profile = {
         'id': user['id'],
         'username': user['username'],
@@ -259,21 +401,16 @@ def _build_profile(user):
         'last_login': user['last_login']
     }
 
-    if user['role_name'] == 'Patient':
-        patient = query_db('SELECT * FROM patients WHERE user_id=?', [user['id']], one=True)
-        if patient:
-            profile['patient_id'] = patient['id']
-            profile['mrn'] = patient['mrn']
-            profile['first_name'] = patient['first_name']
-            profile['last_name'] = patient['last_name']
-    elif user['role_name'] == 'Doctor':
-        doctor = query_db('SELECT d.*, dep.name as department_name FROM doctors d LEFT JOIN departments dep ON d.department_id=dep.id WHERE d.user_id=?',
-                          [user['id']], one=True)
-        if doctor:
-            profile['doctor_id'] = doctor['id']
-            profile['first_name'] = doctor['first_name']
-            profile['last_name'] = doctor['last_name']
-            profile['specialization'] = doctor['specialization']
-            profile['department'] = doctor['department_name']
+    if user['role_name'] == 'Patient' and user['patient_id'] is not None:
+        profile['patient_id'] = user['patient_id']
+        profile['mrn'] = user['mrn']
+        profile['first_name'] = user['patient_first_name']
+        profile['last_name'] = user['patient_last_name']
+    elif user['role_name'] == 'Doctor' and user['doctor_id'] is not None:
+        profile['doctor_id'] = user['doctor_id']
+        profile['first_name'] = user['doctor_first_name']
+        profile['last_name'] = user['doctor_last_name']
+        profile['specialization'] = user['specialization']
+        profile['department'] = user['department_name']
 
     return profile
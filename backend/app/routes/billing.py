@@ -1,13 +1,29 @@
 import os
+from functools import lru_cache
 from flask import Blueprint, request, jsonify, g, send_file
-from ..database import query_db, execute_db, dicts_from_rows, dict_from_row
+from ..database import query_db, execute_db, execute_many, dicts_from_rows, dict_from_row
 from ..middleware import jwt_required, role_required, get_patient_id_for_user, log_audit
-from ..utils import validate_required, generate_invoice_number, parse_pagination, allowed_file, save_upload
+from ..utils import validate_required, generate_invoice_number, parse_pagination, paged_list, allowed_file, save_upload
 from ..config import Config
 from ..blockchain import get_blockchain_service
 
 billing_bp = Blueprint('billing', __name__, url_prefix='/api/invoices')
 
+_PAY_FIELDS = frozenset({'paid_amount', 'payment_status', 'payment_method', 'payment_date',
+                         'insurance_claim_status', 'insurance_claim_amount', 'discount_amount'})
+
+
+@lru_cache(maxsize=256)
+def _payment_update_sql(present):
+    """UPDATE statement for a given set of payment fields.
+
+    Cached so repeated updates of the same shape hand SQLite identical
+    text and hit its prepared-statement cache; sorted so equal sets map
+    to one statement regardless of request key order.
+    """
+    cols = ', '.join(f'{f}=?' for f in sorted(present))
+    return f'UPDATE invoices SET {cols}, updated_at=CURRENT_TIMESTAMP WHERE id=?'
+
 
 @billing_bp.route('', methods=['GET'])
 @jwt_required
@@ -16,30 +32,49 @@ def list_invoices():
     patient_id = request.args.get('patient_id', type=int)
     page, per_page = parse_pagination(request)
 
-    query = '''SELECT i.*, p.mrn, p.first_name || ' ' || p.last_name as patient_name
-               FROM invoices i JOIN patients p ON i.patient_id=p.id WHERE 1=1'''
+    base = 'FROM invoices i JOIN patients p ON i.patient_id=p.id WHERE 1=1'
     args = []
 
     if role == 'Patient':
         pid = get_patient_id_for_user(g.current_user['id'])
-        query += ' AND i.patient_id=?'
+        base += ' AND i.patient_id=?'
         args.append(pid)
     elif patient_id:
-        query += ' AND i.patient_id=?'
+        base += ' AND i.patient_id=?'
         args.append(patient_id)
 
     status = request.args.get('payment_status')
     if status:
-        query += ' AND i.payment_status=?'
+        base += ' AND i.payment_status=?'
         args.append(status)
 
-    count_q = query.replace("SELECT i.*, p.mrn, p.first_name || ' ' || p.last_name as patient_name", 'SELECT COUNT(*) as cnt')
-    total = query_db(count_q, args, one=True)['cnt']
-
-    query += ' ORDER BY i.invoice_date DESC LIMIT ? OFFSET ?'
-    args.extend([per_page, (page - 1) * per_page])
-
-    invoices = dicts_from_rows(query_db(query, args))
+    # Keyset mode: a cursor of "<invoice_date>_<id>" seeks straight to
+    # the next page through idx_invoices_date_id, instead of reading and
+    # discarding OFFSET rows — page 100 costs the same as page 1. The
+    # page/per_page mode stays for callers that need totals or random
+    # page access.
+    if 'cursor' in request.args:
+        cursor = request.args.get('cursor')
+        if cursor:
+            try:
+                cur_date, cur_id = cursor.rsplit('_', 1)
+                cur_id = int(cur_id)
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+            base += ' AND (i.invoice_date, i.id) < (?, ?)'
+            args += [cur_date, cur_id]
+        invoices = query_db(
+            "SELECT i.*, p.mrn, p.first_name || ' ' || p.last_name as patient_name "
+            + base + ' ORDER BY i.invoice_date DESC, i.id DESC LIMIT ?',
+            [*args, per_page])
+        next_cursor = (f"{invoices[-1]['invoice_date']}_{invoices[-1]['id']}"
+                       if len(invoices) == per_page else None)
+        return jsonify({'invoices': invoices, 'per_page': per_page,
+                        'next_cursor': next_cursor}), 200
+
+    invoices, total = paged_list(
+        "SELECT i.*, p.mrn, p.first_name || ' ' || p.last_name as patient_name",
+        base, args, 'ORDER BY i.invoice_date DESC, i.id DESC', page, per_page)
     return jsonify({'invoices': invoices, 'total': total, 'page': page, 'per_page': per_page}), 200
 
 
@@ -60,17 +95,17 @@ def get_invoice(invoice_id):
         if invoice['patient_id'] != pid:
             return jsonify({'error': 'Access denied'}), 403
 
+    # One dict for the row being extended; the nested rows go to the
+    # JSON provider as-is and are converted only while serializing
     result = dict_from_row(invoice)
-    items = dicts_from_rows(query_db('SELECT * FROM invoice_items WHERE invoice_id=?', [invoice_id]))
-    result['items'] = items
+    result['items'] = query_db('SELECT * FROM invoice_items WHERE invoice_id=?', [invoice_id])
 
     # Attach files
-    result['files'] = dicts_from_rows(query_db('SELECT id, file_name, original_name, file_size, mime_type FROM invoice_files WHERE invoice_id=?', [invoice_id]))
+    result['files'] = query_db('SELECT id, file_name, original_name, file_size, mime_type FROM invoice_files WHERE invoice_id=?', [invoice_id])
 
     # Insurance info
-    insurance = query_db('SELECT * FROM insurance WHERE patient_id=? AND is_active=1',
-                         [invoice['patient_id']], one=True)
-    result['insurance'] = dict_from_row(insurance) if insurance else None
+    result['insurance'] = query_db('SELECT * FROM insurance WHERE patient_id=? AND is_active=1',
+                                   [invoice['patient_id']], one=True)
 
     log_audit('VIEW_INVOICE', 'invoice', invoice_id)
     return jsonify({'invoice': result}), 200
@@ -134,8 +169,7 @@ def create_invoice():
 @jwt_required
 @role_required('Admin', 'Staff')
 def add_items(invoice_id):
-    invoice = query_db('SELECT * FROM invoices WHERE id=?', [invoice_id], one=True)
-    if not invoice:
+    if not query_db('SELECT 1 FROM invoices WHERE id=?', [invoice_id], one=True):
         return jsonify({'error': 'Invoice not found'}), 404
 
     data = request.get_json()
@@ -153,41 +187,16 @@ def add_items(invoice_id):
 @role_required('Admin', 'Staff')
 def update_payment(invoice_id):
     data = request.get_json()
-    invoice = query_db('SELECT * FROM invoices WHERE id=?', [invoice_id], one=True)
-    if not invoice:
-        return jsonify({'error': 'Invoice not found'}), 404
-
-    updates = []
-    args = []
-
-    if 'paid_amount' in data:
-        updates.append('paid_amount=?')
-        args.append(data['paid_amount'])
-    if 'payment_status' in data:
-        updates.append('payment_status=?')
-        args.append(data['payment_status'])
-    if 'payment_method' in data:
-        updates.append('payment_method=?')
-        args.append(data['payment_method'])
-    if 'payment_date' in data:
-        updates.append('payment_date=?')
-        args.append(data['payment_date'])
-    if 'insurance_claim_status' in data:
-        updates.append('insurance_claim_status=?')
-        args.append(data['insurance_claim_status'])
-    if 'insurance_claim_amount' in data:
-        updates.append('insurance_claim_amount=?')
-        args.append(data['insurance_claim_amount'])
-    if 'discount_amount' in data:
-        updates.append('discount_amount=?')
-        args.append(data['discount_amount'])
-
-    if not updates:
+    present = frozenset(_PAY_FIELDS & data.keys())
+    if not present:
         return jsonify({'error': 'No fields to update'}), 400
 
-    updates.append('updated_at=CURRENT_TIMESTAMP')
+    args = [data[f] for f in sorted(present)]
     args.append(invoice_id)
-    execute_db(f"UPDATE invoices SET {', '.join(updates)} WHERE id=?", args)
+    # The UPDATE's rowcount doubles as the existence check; no need to
+    # read the invoice first just to 404
+    if not execute_db(_payment_update_sql(present), args, return_lastrowid=False):
+        return jsonify({'error': 'Invoice not found'}), 404
 
     # Notify patient
     patient = query_db('SELECT p.user_id FROM patients p JOIN invoices i ON i.patient_id=p.id WHERE i.id=?',
@@ -207,20 +216,20 @@ def update_payment(invoice_id):
 
 def _add_items(invoice_id, items):
     """Add items to an invoice and recalculate totals."""
-    for item in items:
-        total_price = float(item.get('quantity', 1)) * float(item['unit_price'])
-        execute_db(
-            '''INSERT INTO invoice_items (invoice_id, item_type, description, quantity, unit_price, total_price)
-               VALUES (?,?,?,?,?,?)''',
-            [invoice_id, item['item_type'], item['description'],
-             item.get('quantity', 1), item['unit_price'], total_price]
-        )
-
-    # Recalculate
-    row = query_db('SELECT SUM(total_price) as subtotal FROM invoice_items WHERE invoice_id=?',
+    rows = [[invoice_id, item['item_type'], item['description'],
+             item.get('quantity', 1), item['unit_price'],
+             float(item.get('quantity', 1)) * float(item['unit_price'])]
+            for item in items]
+    execute_many(
+        '''INSERT INTO invoice_items (invoice_id, item_type, description, quantity, unit_price, total_price)
+           VALUES (?,?,?,?,?,?)''', rows)
+
+    # Recalculate: the new items' sum is already in hand, so only the
+    # stored subtotal/tax/discount need one lookup
+    added = sum(row[5] for row in rows)
+    inv = query_db('SELECT subtotal, tax_amount, discount_amount FROM invoices WHERE id=?',
                    [invoice_id], one=True)
-    subtotal = row['subtotal'] or 0
-    inv = query_db('SELECT tax_amount, discount_amount FROM invoices WHERE id=?', [invoice_id], one=True)
+    subtotal = (inv['subtotal'] or 0) + added
     total = subtotal + (inv['tax_amount'] or 0) - (inv['discount_amount'] or 0)
     execute_db('UPDATE invoices SET subtotal=?, total_amount=?, updated_at=CURRENT_TIMESTAMP WHERE id=?',
                [subtotal, total, invoice_id])
@@ -231,8 +240,7 @@ def _add_items(invoice_id, items):
 @role_required('Admin', 'Staff')
 def upload_invoice_file(invoice_id):
     """Upload a file (bill soft copy) to an invoice."""
-    invoice = query_db('SELECT * FROM invoices WHERE id=?', [invoice_id], one=True)
-    if not invoice:
+    if not query_db('SELECT 1 FROM invoices WHERE id=?', [invoice_id], one=True):
         return jsonify({'error': 'Invoice not found'}), 404
 
     files = request.files.getlist('files')
@@ -242,11 +250,11 @@ def upload_invoice_file(invoice_id):
     uploaded = []
     for f in files:
         if f and allowed_file(f.filename):
-            safe_name, rel_path, file_size, mime_type = save_upload(f, f'invoices/{invoice_id}')
+            safe_name, rel_path, file_size, mime_type, file_hash = save_upload(f, f'invoices/{invoice_id}')
             file_id = execute_db(
-                '''INSERT INTO invoice_files (invoice_id, file_name, original_name, file_path, file_size, mime_type)
-                   VALUES (?,?,?,?,?,?)''',
-                [invoice_id, safe_name, f.filename, rel_path, file_size, mime_type]
+                '''INSERT INTO invoice_files (invoice_id, file_name, original_name, file_path, file_size, mime_type, file_hash)
+                   VALUES (?,?,?,?,?,?,?)''',
+                [invoice_id, safe_name, f.filename, rel_path, file_size, mime_type, file_hash]
             )
             uploaded.append({'id': file_id, 'original_name': f.filename, 'file_size': file_size})
 
@@ -274,11 +282,16 @@ def download_invoice_file(file_id):
             return jsonify({'error': 'Access denied'}), 403
 
     file_path = os.path.join(Config.UPLOAD_FOLDER, rf['file_path'])
-    if not os.path.exists(file_path):
+    try:
+        stat = os.stat(file_path)
+    except OSError:
         return jsonify({'error': 'File not found on disk'}), 404
 
     log_audit('DOWNLOAD_INVOICE_FILE', 'invoice_file', file_id)
-    return send_file(file_path, download_name=rf['original_name'], as_attachment=True)
+    # conditional=True serves ETag/If-Modified-Since (repeat downloads
+    # short-circuit with 304) and honours Range requests
+    return send_file(file_path, download_name=rf['original_name'], as_attachment=True,
+                     conditional=True, last_modified=stat.st_mtime)
 
 
 @billing_bp.route('/<int:invoice_id>/files/<int:file_id>', methods=['DELETE'])
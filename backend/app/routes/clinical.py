@@ -1,5 +1,5 @@
 from flask import Blueprint, request, jsonify, g
-from ..database import query_db, execute_db, dicts_from_rows, dict_from_row
+from ..database import query_db, execute_db
 from ..middleware import jwt_required, role_required, get_patient_id_for_user, log_audit
 from ..utils import validate_required, parse_pagination
 
@@ -20,8 +20,8 @@ def list_allergies():
     if not patient_id:
         return jsonify({'error': 'patient_id required'}), 400
 
-    allergies = dicts_from_rows(query_db(
-        'SELECT * FROM allergies WHERE patient_id=? ORDER BY noted_date DESC', [patient_id]))
+    allergies = query_db(
+        'SELECT * FROM allergies WHERE patient_id=? ORDER BY noted_date DESC', [patient_id])
     return jsonify({'allergies': allergies}), 200
 
 
@@ -59,8 +59,8 @@ def list_vitals():
     if not patient_id:
         return jsonify({'error': 'patient_id required'}), 400
 
-    vitals = dicts_from_rows(query_db(
-        'SELECT * FROM vitals WHERE patient_id=? ORDER BY recorded_at DESC', [patient_id]))
+    vitals = query_db(
+        'SELECT * FROM vitals WHERE patient_id=? ORDER BY recorded_at DESC', [patient_id])
     return jsonify({'vitals': vitals}), 200
 
 
@@ -120,7 +120,7 @@ def list_notes():
         return jsonify({'error': 'patient_id or visit_id required'}), 400
 
     query += ' ORDER BY cn.created_at DESC'
-    notes = dicts_from_rows(query_db(query, args))
+    notes = query_db(query, args)
     return jsonify({'clinical_notes': notes}), 200
 
 
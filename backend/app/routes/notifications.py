@@ -1,7 +1,7 @@
 from flask import Blueprint, request, jsonify, g
-from ..database import query_db, execute_db, dicts_from_rows
+from ..database import query_db, execute_db
 from ..middleware import jwt_required, log_audit
-from ..utils import parse_pagination
+from ..utils import parse_pagination, paged_list
 
 notifications_bp = Blueprint('notifications', __name__, url_prefix='/api/notifications')
 
@@ -12,22 +12,17 @@ def list_notifications():
     page, per_page = parse_pagination(request)
     unread_only = request.args.get('unread', '').lower() == 'true'
 
-    query = 'SELECT * FROM notifications WHERE user_id=?'
+    base = 'FROM notifications WHERE user_id=?'
     args = [g.current_user['id']]
 
     if unread_only:
-        query += ' AND is_read=0'
-
-    count_q = query.replace('SELECT *', 'SELECT COUNT(*) as cnt')
-    total = query_db(count_q, args, one=True)['cnt']
+        base += ' AND is_read=0'
 
     unread_count = query_db('SELECT COUNT(*) as cnt FROM notifications WHERE user_id=? AND is_read=0',
                             [g.current_user['id']], one=True)['cnt']
 
-    query += ' ORDER BY created_at DESC LIMIT ? OFFSET ?'
-    args.extend([per_page, (page - 1) * per_page])
-
-    notifications = dicts_from_rows(query_db(query, args))
+    notifications, total = paged_list('SELECT *', base, args,
+                                      'ORDER BY created_at DESC', page, per_page)
     return jsonify({
         'notifications': notifications,
         'total': total,
@@ -1,8 +1,8 @@
 from flask import Blueprint, request, jsonify, g
 import bcrypt
-from ..database import query_db, execute_db, dicts_from_rows, dict_from_row
+from ..database import query_db, execute_db, dict_from_row
 from ..middleware import jwt_required, role_required, get_patient_id_for_user, log_audit
-from ..utils import validate_required, generate_mrn, parse_pagination
+from ..utils import validate_required, generate_mrn, parse_pagination, paged_list
 from ..blockchain import get_blockchain_service
 
 patients_bp = Blueprint('patients', __name__, url_prefix='/api/patients')
@@ -18,32 +18,27 @@ def list_patients():
         if not pid:
             return jsonify({'patients': [], 'total': 0}), 200
         patient = query_db('SELECT * FROM patients WHERE id=? AND is_active=1', [pid], one=True)
-        return jsonify({'patients': [dict_from_row(patient)] if patient else [], 'total': 1 if patient else 0}), 200
+        return jsonify({'patients': [patient] if patient else [], 'total': 1 if patient else 0}), 200
 
     page, per_page = parse_pagination(request)
     search = request.args.get('search', '')
 
-    query = 'SELECT * FROM patients WHERE is_active=1'
+    base = 'FROM patients WHERE is_active=1'
     args = []
 
     if role == 'Doctor':
         from ..middleware import get_doctor_id_for_user
         doc_id = get_doctor_id_for_user(g.current_user['id'])
-        query += ''' AND id IN (SELECT DISTINCT patient_id FROM visits WHERE doctor_id=?
+        base += ''' AND id IN (SELECT DISTINCT patient_id FROM visits WHERE doctor_id=?
                      UNION SELECT DISTINCT patient_id FROM appointments WHERE doctor_id=?)'''
         args.extend([doc_id, doc_id])
 
     if search:
-        query += ' AND (first_name LIKE ? OR last_name LIKE ? OR mrn LIKE ? OR phone LIKE ?)'
+        base += ' AND (first_name LIKE ? OR last_name LIKE ? OR mrn LIKE ? OR phone LIKE ?)'
         args.extend([f'%{search}%'] * 4)
 
-    count_q = query.replace('SELECT *', 'SELECT COUNT(*) as cnt')
-    total = query_db(count_q, args, one=True)['cnt']
-
-    query += ' ORDER BY created_at DESC LIMIT ? OFFSET ?'
-    args.extend([per_page, (page - 1) * per_page])
-
-    patients = dicts_from_rows(query_db(query, args))
+    patients, total = paged_list('SELECT *', base, args,
+                                 'ORDER BY created_at DESC', page, per_page)
     return jsonify({'patients': patients, 'total': total, 'page': page, 'per_page': per_page}), 200
 
 
@@ -64,8 +59,7 @@ def get_patient(patient_id):
     result = dict_from_row(patient)
 
     # Fetch insurance
-    insurance = dicts_from_rows(query_db('SELECT * FROM insurance WHERE patient_id=?', [patient_id]))
-    result['insurance'] = insurance
+    result['insurance'] = query_db('SELECT * FROM insurance WHERE patient_id=?', [patient_id])
 
     log_audit('VIEW_PATIENT', 'patient', patient_id, f"Viewed patient {patient['mrn']}")
     return jsonify({'patient': result}), 200
@@ -222,7 +216,7 @@ def update_patient(patient_id):
 @patients_bp.route('/departments', methods=['GET'])
 @jwt_required
 def list_departments():
-    depts = dicts_from_rows(query_db('SELECT * FROM departments WHERE is_active=1 ORDER BY name'))
+    depts = query_db('SELECT * FROM departments WHERE is_active=1 ORDER BY name')
     return jsonify({'departments': depts}), 200
 
 
@@ -239,5 +233,5 @@ def list_doctors():
         query += ' AND d.department_id=?'
         args.append(dept_id)
     query += ' ORDER BY d.first_name'
-    doctors = dicts_from_rows(query_db(query, args))
+    doctors = query_db(query, args)
     return jsonify({'doctors': doctors}), 200
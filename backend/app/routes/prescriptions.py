@@ -19,33 +19,33 @@ def list_prescriptions():
     if not patient_id:
         if role == 'Doctor':
             doc_id = get_doctor_id_for_user(g.current_user['id'])
-            prescriptions = dicts_from_rows(query_db(
+            prescriptions = query_db(
                 '''SELECT pr.*, p.mrn, p.first_name || ' ' || p.last_name as patient_name,
                           d.first_name || ' ' || d.last_name as doctor_name
                    FROM prescriptions pr
                    JOIN patients p ON pr.patient_id=p.id
                    JOIN doctors d ON pr.doctor_id=d.id
-                   WHERE pr.doctor_id=? ORDER BY pr.prescription_date DESC''', [doc_id]))
+                   WHERE pr.doctor_id=? ORDER BY pr.prescription_date DESC''', [doc_id])
             return jsonify({'prescriptions': prescriptions}), 200
         if role in ('Admin', 'Staff'):
-            prescriptions = dicts_from_rows(query_db(
+            prescriptions = query_db(
                 '''SELECT pr.*, p.mrn, p.first_name || ' ' || p.last_name as patient_name,
                           d.first_name || ' ' || d.last_name as doctor_name,
                           (SELECT COUNT(*) FROM medications WHERE prescription_id=pr.id) as medication_count
                    FROM prescriptions pr
                    JOIN patients p ON pr.patient_id=p.id
                    JOIN doctors d ON pr.doctor_id=d.id
-                   ORDER BY pr.prescription_date DESC'''))
+                   ORDER BY pr.prescription_date DESC''')
             return jsonify({'prescriptions': prescriptions}), 200
         return jsonify({'error': 'patient_id required'}), 400
 
-    prescriptions = dicts_from_rows(query_db(
+    prescriptions = query_db(
         '''SELECT pr.*, p.mrn, p.first_name || ' ' || p.last_name as patient_name,
                   d.first_name || ' ' || d.last_name as doctor_name
            FROM prescriptions pr
            JOIN patients p ON pr.patient_id=p.id
            JOIN doctors d ON pr.doctor_id=d.id
-           WHERE pr.patient_id=? ORDER BY pr.prescription_date DESC''', [patient_id]))
+           WHERE pr.patient_id=? ORDER BY pr.prescription_date DESC''', [patient_id])
 
     return jsonify({'prescriptions': prescriptions}), 200
 
@@ -71,8 +71,7 @@ def get_prescription(rx_id):
             return jsonify({'error': 'Access denied'}), 403
 
     result = dict_from_row(rx)
-    meds = dicts_from_rows(query_db('SELECT * FROM medications WHERE prescription_id=?', [rx_id]))
-    result['medications'] = meds
+    result['medications'] = query_db('SELECT * FROM medications WHERE prescription_id=?', [rx_id])
 
     log_audit('VIEW_PRESCRIPTION', 'prescription', rx_id)
     return jsonify({'prescription': result}), 200
@@ -2,7 +2,7 @@ import os
 from flask import Blueprint, request, jsonify, g, send_file
 from ..database import query_db, execute_db, dicts_from_rows, dict_from_row
 from ..middleware import jwt_required, role_required, get_patient_id_for_user, log_audit
-from ..utils import allowed_file, save_upload, validate_required, parse_pagination
+from ..utils import allowed_file, save_upload, validate_required, parse_pagination, paged_list
 from ..config import Config
 from ..blockchain import get_blockchain_service
 
@@ -20,11 +20,7 @@ def list_reports():
 
     page, per_page = parse_pagination(request)
 
-    query = '''SELECT r.*, p.mrn, p.first_name || ' ' || p.last_name as patient_name,
-                      d.first_name || ' ' || d.last_name as doctor_name,
-                      dep.name as department_name,
-                      u.username as uploaded_by_name
-               FROM reports r
+    base = '''FROM reports r
                JOIN patients p ON r.patient_id=p.id
                LEFT JOIN doctors d ON r.ordering_doctor_id=d.id
                LEFT JOIN departments dep ON r.department_id=dep.id
@@ -33,23 +29,20 @@ def list_reports():
     args = []
 
     if patient_id:
-        query += ' AND r.patient_id=?'
+        base += ' AND r.patient_id=?'
         args.append(patient_id)
 
     report_type = request.args.get('report_type')
     if report_type:
-        query += ' AND r.report_type=?'
+        base += ' AND r.report_type=?'
         args.append(report_type)
 
-    count_q = query.replace(
-        "SELECT r.*, p.mrn, p.first_name || ' ' || p.last_name as patient_name,\n                      d.first_name || ' ' || d.last_name as doctor_name,\n                      dep.name as department_name,\n                      u.username as uploaded_by_name",
-        'SELECT COUNT(*) as cnt')
-    total = query_db(count_q, args, one=True)['cnt']
-
-    query += ' ORDER BY r.report_date DESC LIMIT ? OFFSET ?'
-    args.extend([per_page, (page - 1) * per_page])
-
-    reports = dicts_from_rows(query_db(query, args))
+    reports, total = paged_list(
+        '''SELECT r.*, p.mrn, p.first_name || ' ' || p.last_name as patient_name,
+                  d.first_name || ' ' || d.last_name as doctor_name,
+                  dep.name as department_name,
+                  u.username as uploaded_by_name''',
+        base, args, 'ORDER BY r.report_date DESC', page, per_page)
 
     # Attach files to each report
     for r in reports:
@@ -115,20 +108,20 @@ def create_report():
 
     # Handle file uploads
     files = request.files.getlist('files')
-    file_data = None
+    file_path = None
     filename = None
     for f in files:
         if f and allowed_file(f.filename):
-            # Read file data for blockchain hashing before saving
-            if file_data is None:
-                file_data = f.read()
+            safe_name, rel_path, file_size, mime_type, file_hash = save_upload(f, f'reports/{report_id}')
+            # Remember the first saved file for blockchain hashing;
+            # it is streamed from disk instead of buffered in memory
+            if file_path is None:
+                file_path = os.path.join(Config.UPLOAD_FOLDER, rel_path)
                 filename = f.filename
-                f.seek(0)  # Reset stream for save_upload
-            safe_name, rel_path, file_size, mime_type = save_upload(f, f'reports/{report_id}')
             execute_db(
-                '''INSERT INTO report_files (report_id, file_name, original_name, file_path, file_size, mime_type)
-                   VALUES (?,?,?,?,?,?)''',
-                [report_id, safe_name, f.filename, rel_path, file_size, mime_type]
+                '''INSERT INTO report_files (report_id, file_name, original_name, file_path, file_size, mime_type, file_hash)
+                   VALUES (?,?,?,?,?,?,?)''',
+                [report_id, safe_name, f.filename, rel_path, file_size, mime_type, file_hash]
             )
 
     # Notify patient
@@ -149,15 +142,25 @@ def create_report():
         blockchain_service = get_blockchain_service()
         report_record = query_db('SELECT * FROM reports WHERE id=?', [report_id], one=True)
         if report_record:
-            blockchain_service.store_report(
-                report_id,
-                patient_id,
-                dict_from_row(report_record),
-                file_data=file_data,
-                filename=filename,
-                upload_to_ipfs=True,  # IPFS enabled with Pinata
-                metadata={'createdBy': g.current_user['id']}
-            )
+            if file_path:
+                with open(file_path, 'rb') as fh:
+                    blockchain_service.store_report(
+                        report_id,
+                        patient_id,
+                        dict_from_row(report_record),
+                        file_data=fh,
+                        filename=filename,
+                        upload_to_ipfs=True,  # IPFS enabled with Pinata
+                        metadata={'createdBy': g.current_user['id']}
+                    )
+            else:
+                blockchain_service.store_report(
+                    report_id,
+                    patient_id,
+                    dict_from_row(report_record),
+                    upload_to_ipfs=True,  # IPFS enabled with Pinata
+                    metadata={'createdBy': g.current_user['id']}
+                )
     except Exception as e:
         print(f"Blockchain store error: {e}")
 
@@ -195,8 +198,11 @@ def download_file(file_id):
             return jsonify({'error': 'Access denied'}), 403
 
     file_path = os.path.join(Config.UPLOAD_FOLDER, rf['file_path'])
-    if not os.path.exists(file_path):
+    try:
+        stat = os.stat(file_path)
+    except OSError:
         return jsonify({'error': 'File not found on disk'}), 404
 
     log_audit('DOWNLOAD_FILE', 'report_file', file_id)
-    return send_file(file_path, download_name=rf['original_name'], as_attachment=True)
+    return send_file(file_path, download_name=rf['original_name'], as_attachment=True,
+                     conditional=True, last_modified=stat.st_mtime)
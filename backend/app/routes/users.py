@@ -1,8 +1,8 @@
 from flask import Blueprint, request, jsonify, g
 import bcrypt
-from ..database import query_db, execute_db, dicts_from_rows
-from ..middleware import jwt_required, role_required, log_audit
-from ..utils import validate_required, validate_email, parse_pagination
+from ..database import query_db, execute_db
+from ..middleware import jwt_required, role_required, log_audit, get_role_id, invalidate_lookup_cache
+from ..utils import validate_required, validate_email, parse_pagination, paged_list
 
 users_bp = Blueprint('users', __name__, url_prefix='/api/users')
 
@@ -15,25 +15,20 @@ def list_users():
     role_filter = request.args.get('role', '')
     search = request.args.get('search', '')
 
-    query = '''SELECT u.id, u.username, u.email, u.phone, u.is_active, u.last_login, u.created_at,
-                      r.name as role_name
-               FROM users u JOIN roles r ON u.role_id=r.id WHERE 1=1'''
+    base = 'FROM users u JOIN roles r ON u.role_id=r.id WHERE 1=1'
     args = []
 
     if role_filter:
-        query += ' AND r.name=?'
+        base += ' AND r.name=?'
         args.append(role_filter)
     if search:
-        query += ' AND (u.username LIKE ? OR u.email LIKE ?)'
+        base += ' AND (u.username LIKE ? OR u.email LIKE ?)'
         args.extend([f'%{search}%', f'%{search}%'])
 
-    count_q = query.replace('SELECT u.id, u.username, u.email, u.phone, u.is_active, u.last_login, u.created_at,\n                      r.name as role_name', 'SELECT COUNT(*) as cnt')
-    total = query_db(count_q, args, one=True)['cnt']
-
-    query += ' ORDER BY u.created_at DESC LIMIT ? OFFSET ?'
-    args.extend([per_page, (page - 1) * per_page])
-
-    users = dicts_from_rows(query_db(query, args))
+    users, total = paged_list(
+        '''SELECT u.id, u.username, u.email, u.phone, u.is_active, u.last_login, u.created_at,
+                  r.name as role_name''',
+        base, args, 'ORDER BY u.created_at DESC', page, per_page)
     return jsonify({'users': users, 'total': total, 'page': page, 'per_page': per_page}), 200
 
 
@@ -53,17 +48,18 @@ def create_user():
     if existing:
         return jsonify({'error': 'Username already exists'}), 409
 
-    role = query_db('SELECT id FROM roles WHERE name=?', [data['role']], one=True)
-    if not role:
+    role_id = get_role_id(data['role'])
+    if not role_id:
         return jsonify({'error': 'Invalid role'}), 400
 
     pw_hash = bcrypt.hashpw(data['password'].encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
 
     user_id = execute_db(
         'INSERT INTO users (username, password_hash, email, phone, role_id) VALUES (?,?,?,?,?)',
-        [data['username'], pw_hash, data.get('email'), data.get('phone'), role['id']]
+        [data['username'], pw_hash, data.get('email'), data.get('phone'), role_id]
     )
 
+    invalidate_lookup_cache()
     log_audit('CREATE_USER', 'user', user_id, f"Created user {data['username']} with role {data['role']}")
     return jsonify({'message': 'User created', 'user_id': user_id}), 201
 
@@ -104,6 +100,7 @@ def update_user(user_id):
     args.append(user_id)
 
     execute_db(f"UPDATE users SET {', '.join(updates)} WHERE id=?", args)
+    invalidate_lookup_cache()
     log_audit('UPDATE_USER', 'user', user_id, f"Updated user {user['username']}")
     return jsonify({'message': 'User updated'}), 200
 
@@ -120,6 +117,7 @@ def deactivate_user(user_id):
         return jsonify({'error': 'Cannot deactivate your own account'}), 400
 
     execute_db('UPDATE users SET is_active=0, updated_at=CURRENT_TIMESTAMP WHERE id=?', [user_id])
+    invalidate_lookup_cache()
     log_audit('DEACTIVATE_USER', 'user', user_id, f"Deactivated user {user['username']}")
     return jsonify({'message': 'User deactivated'}), 200
 
@@ -128,5 +126,5 @@ def deactivate_user(user_id):
 @jwt_required
 @role_required('Admin')
 def list_roles():
-    roles = dicts_from_rows(query_db('SELECT * FROM roles ORDER BY id'))
+    roles = query_db('SELECT * FROM roles ORDER BY id')
     return jsonify({'roles': roles}), 200
@@ -1,7 +1,7 @@
 from flask import Blueprint, request, jsonify, g
-from ..database import query_db, execute_db, dicts_from_rows, dict_from_row
+from ..database import query_db, execute_db, dict_from_row
 from ..middleware import jwt_required, role_required, get_patient_id_for_user, get_doctor_id_for_user, log_audit
-from ..utils import validate_required, parse_pagination
+from ..utils import validate_required, parse_pagination, paged_list
 from ..blockchain import get_blockchain_service
 
 visits_bp = Blueprint('visits', __name__, url_prefix='/api/visits')
@@ -14,10 +14,7 @@ def list_visits():
     patient_id = request.args.get('patient_id', type=int)
     page, per_page = parse_pagination(request)
 
-    query = '''SELECT v.*, p.mrn, p.first_name || ' ' || p.last_name as patient_name,
-                      d.first_name || ' ' || d.last_name as doctor_name,
-                      dep.name as department_name
-               FROM visits v
+    base = '''FROM visits v
                JOIN patients p ON v.patient_id=p.id
                LEFT JOIN doctors d ON v.doctor_id=d.id
                LEFT JOIN departments dep ON v.department_id=dep.id
@@ -26,35 +23,31 @@ def list_visits():
 
     if role == 'Patient':
         pid = get_patient_id_for_user(g.current_user['id'])
-        query += ' AND v.patient_id=?'
+        base += ' AND v.patient_id=?'
         args.append(pid)
     elif role == 'Doctor':
         doc_id = get_doctor_id_for_user(g.current_user['id'])
-        query += ' AND v.doctor_id=?'
+        base += ' AND v.doctor_id=?'
         args.append(doc_id)
     elif patient_id:
-        query += ' AND v.patient_id=?'
+        base += ' AND v.patient_id=?'
         args.append(patient_id)
 
     status = request.args.get('status')
     if status:
-        query += ' AND v.status=?'
+        base += ' AND v.status=?'
         args.append(status)
 
     visit_type = request.args.get('visit_type')
     if visit_type:
-        query += ' AND v.visit_type=?'
+        base += ' AND v.visit_type=?'
         args.append(visit_type)
 
-    count_q = query.replace(
-        "SELECT v.*, p.mrn, p.first_name || ' ' || p.last_name as patient_name,\n                      d.first_name || ' ' || d.last_name as doctor_name,\n                      dep.name as department_name",
-        'SELECT COUNT(*) as cnt')
-    total = query_db(count_q, args, one=True)['cnt']
-
-    query += ' ORDER BY v.admission_date DESC LIMIT ? OFFSET ?'
-    args.extend([per_page, (page - 1) * per_page])
-
-    visits = dicts_from_rows(query_db(query, args))
+    visits, total = paged_list(
+        '''SELECT v.*, p.mrn, p.first_name || ' ' || p.last_name as patient_name,
+                  d.first_name || ' ' || d.last_name as doctor_name,
+                  dep.name as department_name''',
+        base, args, 'ORDER BY v.admission_date DESC', page, per_page)
     return jsonify({'visits': visits, 'total': total, 'page': page, 'per_page': per_page}), 200
 
 
@@ -81,7 +74,7 @@ def get_visit(visit_id):
             return jsonify({'error': 'Access denied'}), 403
 
     log_audit('VIEW_VISIT', 'visit', visit_id)
-    return jsonify({'visit': dict_from_row(visit)}), 200
+    return jsonify({'visit': visit}), 200
 
 
 @visits_bp.route('', methods=['POST'])
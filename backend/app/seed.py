@@ -74,11 +74,12 @@ def seed_data():
             )
 
         conn.commit()
+        # Give the query planner statistics so it prefers the composite
+        # indexes once real data starts accumulating
+        conn.execute("ANALYZE")
         print("Database seeded successfully with sample data.")
 
     except Exception as e:
         conn.rollback()
         print(f"Error seeding database: {e}")
         raise
-    finally:
-        conn.close()
@@ -1,3 +1,4 @@
+import hashlib
 import os
 import uuid
 import re
@@ -11,9 +12,9 @@ def allowed_file(filename):
 
 
 def save_upload(file, subfolder='general'):
-    """Save an uploaded file and return the saved filename and path."""
+    """Save an uploaded file; return its name, path, size, type and SHA-256."""
     if not file or not file.filename:
-        return None, None, None, None
+        return None, None, None, None, None
 
     ext = file.filename.rsplit('.', 1)[1].lower() if '.' in file.filename else 'bin'
     safe_name = f"{uuid.uuid4().hex}.{ext}"
@@ -22,7 +23,13 @@ def save_upload(file, subfolder='general'):
     file_path = os.path.join(folder, safe_name)
     file.save(file_path)
     file_size = os.path.getsize(file_path)
-    return safe_name, os.path.join(subfolder, safe_name), file_size, file.content_type or 'application/octet-stream'
+    # Hash once at upload time so verification can compare the stored
+    # digest instead of re-reading the file; file_digest streams the
+    # whole read+hash loop in C
+    with open(file_path, 'rb') as fh:
+        file_hash = hashlib.file_digest(fh, 'sha256').hexdigest()
+    return (safe_name, os.path.join(subfolder, safe_name), file_size,
+            file.content_type or 'application/octet-stream', file_hash)
 
 
 def generate_mrn():
@@ -85,6 +92,31 @@ def paginate_query(base_query, args, page=1, per_page=20):
     return f"{base_query} LIMIT {per_page} OFFSET {offset}", args
 
 
+def paged_list(select_cols, base, args, order_sql, page, per_page):
+    """Run a filtered list query and its total in one round trip.
+
+    base is the shared 'FROM ... WHERE ...' tail; select_cols gets a
+    COUNT(*) OVER () window column appended so joins and filters are
+    evaluated once for both the page and the total, instead of deriving
+    a count query by string replacement. Returns (rows, total) with the
+    helper column already stripped from the row dicts.
+    """
+    from .database import query_db, dicts_from_rows
+    query = (f'{select_cols}, COUNT(*) OVER () AS total_count {base} '
+             f'{order_sql} LIMIT ? OFFSET ?')
+    rows = dicts_from_rows(query_db(query, [*args, per_page, (page - 1) * per_page]))
+    if rows:
+        total = rows[0]['total_count']
+        for row in rows:
+            del row['total_count']
+    elif page == 1:
+        total = 0
+    else:
+        # Page past the end: fall back to a plain count
+        total = query_db(f'SELECT COUNT(*) as cnt {base}', args, one=True)['cnt']
+    return rows, total
+
+
 def parse_pagination(request):
     """Parse page and per_page from request args."""
     page = max(1, request.args.get('page', 1, type=int))
@@ -94,5 +94,10 @@ for r in reports:
     else:
         print(f"Report {r['id']}: Failed - {result.get('error', 'Unknown error')}")
 
+# Stored rows are persisted write-behind; drain the queue before exiting
+# so the tail of the backfill actually reaches the database
+from app.blockchain.blockchain_service import flush_persist_queue
+flush_persist_queue()
+
 print("\n=== Backfill complete! ===")
 print("\nRun 'python check_blockchain.py' to see all records.")
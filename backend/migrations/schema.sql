@@ -312,6 +312,7 @@ CREATE TABLE IF NOT EXISTS report_files (
     file_path TEXT NOT NULL,
     file_size INTEGER,
     mime_type TEXT,
+    file_hash TEXT,
     uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (report_id) REFERENCES reports(id) ON DELETE CASCADE
 );
@@ -392,6 +393,7 @@ CREATE TABLE IF NOT EXISTS invoice_files (
     file_path TEXT NOT NULL,
     file_size INTEGER,
     mime_type TEXT,
+    file_hash TEXT,
     uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (invoice_id) REFERENCES invoices(id) ON DELETE CASCADE
 );
@@ -436,6 +438,8 @@ CREATE TABLE IF NOT EXISTS audit_logs (
 -- ============================================
 
 CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
+CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
+CREATE INDEX IF NOT EXISTS idx_users_phone ON users(phone);
 CREATE INDEX IF NOT EXISTS idx_users_role ON users(role_id);
 CREATE INDEX IF NOT EXISTS idx_patients_mrn ON patients(mrn);
 CREATE INDEX IF NOT EXISTS idx_patients_user ON patients(user_id);
@@ -448,11 +452,18 @@ CREATE INDEX IF NOT EXISTS idx_allergies_patient ON allergies(patient_id);
 CREATE INDEX IF NOT EXISTS idx_clinical_notes_patient ON clinical_notes(patient_id);
 CREATE INDEX IF NOT EXISTS idx_prescriptions_patient ON prescriptions(patient_id);
 CREATE INDEX IF NOT EXISTS idx_reports_patient ON reports(patient_id);
-CREATE INDEX IF NOT EXISTS idx_appointments_patient ON appointments(patient_id);
-CREATE INDEX IF NOT EXISTS idx_appointments_doctor ON appointments(doctor_id);
 CREATE INDEX IF NOT EXISTS idx_appointments_date ON appointments(appointment_date);
+-- Composite indexes matching list_appointments' WHERE + ORDER BY so
+-- SQLite walks them in order instead of sorting into a temp B-tree
+CREATE INDEX IF NOT EXISTS idx_appointments_patient ON appointments(patient_id, appointment_date DESC, appointment_time DESC);
+CREATE INDEX IF NOT EXISTS idx_appointments_doctor ON appointments(doctor_id, appointment_date DESC, appointment_time DESC);
 CREATE INDEX IF NOT EXISTS idx_invoices_patient ON invoices(patient_id);
+-- Backs keyset pagination in list_invoices: the (invoice_date, id) seek
+-- and ORDER BY both walk this index directly
+CREATE INDEX IF NOT EXISTS idx_invoices_date_id ON invoices(invoice_date DESC, id DESC);
 CREATE INDEX IF NOT EXISTS idx_notifications_user ON notifications(user_id);
 CREATE INDEX IF NOT EXISTS idx_notifications_read ON notifications(user_id, is_read);
-CREATE INDEX IF NOT EXISTS idx_audit_logs_user ON audit_logs(user_id);
 CREATE INDEX IF NOT EXISTS idx_audit_logs_created ON audit_logs(created_at);
+CREATE INDEX IF NOT EXISTS idx_audit_logs_user ON audit_logs(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_audit_logs_resource ON audit_logs(resource_type, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_audit_logs_action ON audit_logs(action, created_at DESC);